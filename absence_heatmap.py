@@ -0,0 +1,129 @@
+"""
+Per-day absence counts (the data behind a year-at-a-glance heatmap).
+
+For a scope of users (a manager's team, or the whole org) and a date range,
+counts how many people are on leave each day, split by LeaveType and
+LeaveStatus. A person counts once per day however many of their leaves
+cover it (overlapping approved and pending requests, say).
+
+The matching leaves are fetched as (user, type, status, start, end) rows and
+clamped to the range. Per series (everyone, each type, each status), each
+user's leaves are sorted and merged into disjoint intervals with a running
+maximum of their ends; every merged interval then adds +1 at its first day
+and -1 the day after its last in a difference array, and one cumulative sum
+along the days turns them into daily counts. All of it is vectorized, so an
+org-wide 10-year range stays cheap.
+"""
+import datetime
+import numpy as np
+from sqlalchemy import select
+from extensions import db
+from models import Leave, LeaveStatus, LeaveType
+from leave_duration import to_datetime64
+
+MAX_RANGE_DAYS = 366 * 20
+DEFAULT_STATUSES = (LeaveStatus.APPROVED, LeaveStatus.PENDING)
+
+_TYPES = list(LeaveType)
+_STATUSES = list(LeaveStatus)
+
+
+def parse_heatmap_args(args):
+    """
+    (start_date, end_date, statuses) from query parameters:
+    - start / end: YYYY-MM-DD (default: the current calendar year)
+    - status: comma-separated LeaveStatus names (default: APPROVED,PENDING)
+    Raises ValueError with a user-facing message.
+    """
+    today = datetime.date.today()
+    try:
+        start_date = datetime.date.fromisoformat(args['start']) if args.get('start') else datetime.date(today.year, 1, 1)
+        end_date = datetime.date.fromisoformat(args['end']) if args.get('end') else datetime.date(today.year, 12, 31)
+    except ValueError:
+        raise ValueError("start and end must be dates in YYYY-MM-DD format.")
+    if start_date > end_date:
+        raise ValueError("start must not be after end.")
+    if (end_date - start_date).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f"The range can span at most {MAX_RANGE_DAYS} days.")
+
+    statuses = DEFAULT_STATUSES
+    if args.get('status'):
+        names = [name.strip().upper() for name in args['status'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in LeaveStatus.__members__]
+        if unknown:
+            raise ValueError(f"Unknown status: {', '.join(unknown)}.")
+        statuses = tuple(LeaveStatus[name] for name in names)
+    return start_date, end_date, statuses
+
+
+def _people_per_day(days, groups, series, starts, ends, num_series):
+    """
+    counts[k, d]: groups of series k with a leave covering day offset d.
+    A group is one user within one series; its overlapping leaves are merged
+    first so it counts once per day. starts/ends are day offsets in [0, days).
+    """
+    width = days + 1
+    if len(groups) == 0:
+        return np.zeros((num_series, days), dtype=np.int64)
+    order = np.lexsort((starts, groups))
+    groups, series, starts, ends = groups[order], series[order], starts[order], ends[order]
+    # Shifting each group by a full width keeps the running maximum from reaching into the next group
+    shift = groups * width
+    reach = np.maximum.accumulate(shift + ends)
+    first = np.ones(len(groups), dtype=bool)
+    first[1:] = shift[1:] + starts[1:] > reach[:-1]  # starts a new merged interval
+    last = np.flatnonzero(np.append(first[1:], True))
+    merged_series = series[first]
+    marks = np.concatenate((merged_series * width + starts[first],
+                            merged_series * width + reach[last] - shift[last] + 1))
+    changes = np.concatenate((np.ones(len(last)), -np.ones(len(last))))
+    diff = np.bincount(marks, weights=changes, minlength=num_series * width)
+    return np.cumsum(diff.reshape(num_series, width)[:, :days], axis=1).astype(np.int64)
+
+
+def absence_heatmap(start_date, end_date, statuses=DEFAULT_STATUSES, user_ids=None):
+    """
+    Daily counts of people on leave over [start_date, end_date] for the users
+    selected by `user_ids` (a SELECT of user ids, or None for everyone):
+    {
+        "start": "YYYY-MM-DD", "end": "YYYY-MM-DD", "statuses": [...],
+        "total":     [people per day],
+        "by_type":   {LeaveType name: [people on that type of leave per day]},
+        "by_status": {LeaveStatus name: [people with a leave in that status per day]}
+    }
+    Only leaves with one of `statuses` are counted. Someone on two kinds of
+    leave the same day counts once in "total" and once under each kind.
+    """
+    days = (end_date - start_date).days + 1
+    conditions = [Leave.start_date <= end_date, Leave.end_date >= start_date, Leave.status.in_(statuses)]
+    if user_ids is not None:
+        conditions.append(Leave.user_id.in_(user_ids))
+    rows = db.session.execute(
+        select(Leave.user_id, Leave.leave_type, Leave.status, Leave.start_date, Leave.end_date).where(*conditions)
+    ).all()
+
+    users = types = leave_statuses = starts = ends = np.zeros(0, dtype=np.int64)
+    if rows:
+        row_users, leave_types, row_statuses, start_dates, end_dates = zip(*rows)
+        first_day = np.datetime64(start_date, 'D')
+        type_codes = {leave_type: code for code, leave_type in enumerate(_TYPES)}
+        status_codes = {status: code for code, status in enumerate(_STATUSES)}
+        users = np.asarray(row_users, dtype=np.int64)
+        types = np.fromiter((type_codes[t] for t in leave_types), dtype=np.int64, count=len(rows))
+        leave_statuses = np.fromiter((status_codes[s] for s in row_statuses), dtype=np.int64, count=len(rows))
+        # Days outside the range are clamped to its edges
+        starts = np.maximum((to_datetime64(start_dates) - first_day).astype(np.int64), 0)
+        ends = np.minimum((to_datetime64(end_dates) - first_day).astype(np.int64), days - 1)
+
+    total = _people_per_day(days, users, np.zeros_like(users), starts, ends, 1)[0]
+    by_type = _people_per_day(days, users * len(_TYPES) + types, types, starts, ends, len(_TYPES))
+    by_status = _people_per_day(days, users * len(_STATUSES) + leave_statuses, leave_statuses, starts, ends,
+                                len(_STATUSES))
+    return {
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "statuses": [status.name for status in _STATUSES if status in statuses],
+        "total": total.tolist(),
+        "by_type": {leave_type.name: by_type[t].tolist() for t, leave_type in enumerate(_TYPES)},
+        "by_status": {status.name: by_status[s].tolist() for s, status in enumerate(_STATUSES) if status in statuses},
+    }
@@ -1,13 +1,16 @@
 import os
+import click
 from flask import Flask, redirect, url_for, request, flash, jsonify
 from flask_login import current_user
-from extensions import db, migrate, login_manager
+from extensions import db, migrate, login_manager, cache, instrumentation
 from config import Config
 from models import User, UserRole  # Make sure User and UserRole are imported
+import org_hierarchy
 from routes.auth import auth_bp
 from routes.admin import admin_bp
 from routes.employee import employee_bp
 from routes.manager import manager_bp
+from routes.api import api_bp
 from routes.__init__ import main_bp
 from dotenv import load_dotenv
 
@@ -21,6 +24,8 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    cache.init_app(app)
+    instrumentation.init_app(app)
 
     # Ensure upload folder exists
     upload_folder = app.config['UPLOAD_FOLDER']
@@ -48,6 +53,7 @@ def create_app():
     app.register_blueprint(admin_bp)
     app.register_blueprint(employee_bp)
     app.register_blueprint(manager_bp)
+    app.register_blueprint(api_bp)
 
     # ======================================================================
     # NEW: Define a custom CLI command to seed the database.
@@ -69,9 +75,148 @@ def create_app():
         )
         admin_user.set_password('adminpassword') # CHANGE THIS IN PRODUCTION
         db.session.add(admin_user)
+        db.session.flush()
+        org_hierarchy.insert_users([admin_user.id])
         db.session.commit()
         print("Default admin user created: admin@example.com / adminpassword")
 
+    @app.cli.command("db-seed-synthetic")
+    @click.option("--users", default=20000, show_default=True, help="Total number of users in the org tree.")
+    @click.option("--leaves", default=2000000, show_default=True, help="Number of leave rows to generate.")
+    @click.option("--years", default=10, show_default=True, help="Years of leave history, ending this year.")
+    @click.option("--seed", default=42, show_default=True, help="Random seed, for reproducible data.")
+    def db_seed_synthetic(users, leaves, years, seed):
+        """Fills the database with a synthetic org for load testing and benchmarks."""
+        from seed_synthetic import generate_org
+
+        try:
+            created = generate_org(users=users, leaves=leaves, years=years, seed=seed)
+        except ValueError as e:
+            print(f"Error: {e}")
+            raise SystemExit(1)
+        print("Synthetic org created: " + ", ".join(f"{count} {table}" for table, count in created.items()))
+        print("All synthetic accounts use the password 'password' (admin: admin@synthetic.example).")
+
+    @app.cli.command("ledger-rebuild")
+    @click.option("--check", is_flag=True, help="Only verify the ledger against the Leave table.")
+    def ledger_rebuild(check):
+        """Rebuilds the LeaveBalance ledger from the Leave table and verifies it."""
+        import ledger
+
+        if not check:
+            rows = ledger.rebuild_ledger()
+            db.session.commit()
+            print(f"Ledger rebuilt: {rows} balance rows written.")
+
+        mismatches = ledger.verify_ledger()
+        if not mismatches:
+            print("Ledger verified: all balances match the Leave table.")
+            return
+        for (user_id, year, leave_type, status), ledger_days, actual_days in mismatches:
+            print(f"Mismatch user={user_id} {year} {leave_type.value}/{status.value}: "
+                  f"ledger={ledger_days} actual={actual_days}")
+        raise SystemExit(1)
+
+    @app.cli.command("org-closure-rebuild")
+    @click.option("--check", is_flag=True, help="Only verify the closure table against User.manager_id.")
+    def org_closure_rebuild(check):
+        """Rebuilds the UserClosure (org hierarchy) table from User.manager_id and verifies it."""
+        if not check:
+            rows = org_hierarchy.rebuild_closure()
+            db.session.commit()
+            print(f"Org closure rebuilt: {rows} rows written.")
+
+        mismatches = org_hierarchy.verify_closure()
+        if not mismatches:
+            print("Org closure verified: it matches the manager tree.")
+            return
+        for ancestor_id, descendant_id, depth in mismatches[:50]:
+            print(f"Mismatch ancestor={ancestor_id} descendant={descendant_id} depth={depth}")
+        print(f"{len(mismatches)} mismatched rows.")
+        raise SystemExit(1)
+
+    @app.cli.command("holidays-import")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--apply", "apply_changes", is_flag=True, help="Write the changes (default: only preview them).")
+    def holidays_import(path, apply_changes):
+        """Imports holidays from a CSV or .ics file (upsert by date; preview unless --apply)."""
+        import os
+        from holiday_import import HolidayImportError, apply_import, diff_holidays, parse_holiday_file
+
+        with open(path, 'rb') as fh:
+            try:
+                entries = parse_holiday_file(os.path.basename(path), fh.read())
+            except (HolidayImportError, UnicodeDecodeError) as e:
+                print(f"Error: {e}")
+                raise SystemExit(1)
+
+        diff = diff_holidays(entries)
+        for entry in diff['added']:
+            print(f"+ {entry.date}  {entry.name}{' (critical)' if entry.is_critical else ''}")
+        for holiday, entry in diff['updated']:
+            print(f"~ {entry.date}  {holiday.name}{' (critical)' if holiday.is_critical else ''}"
+                  f" -> {entry.name}{' (critical)' if entry.is_critical else ''}")
+        print(f"{len(diff['added'])} to add, {len(diff['updated'])} to update, {len(diff['unchanged'])} unchanged.")
+
+        if not apply_changes:
+            print("Preview only; run again with --apply to import.")
+            return
+        written = apply_import(diff)
+        db.session.commit()
+        print(f"Imported {written} holidays.")
+
+    @app.cli.command("users-import")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--apply", "apply_changes", is_flag=True, help="Create the users (default: dry run only).")
+    @click.option("--credentials", type=click.Path(dir_okay=False, writable=True),
+                  help="CSV file to write the new users' temporary passwords to (default: print them).")
+    def users_import(path, apply_changes, credentials):
+        """Creates users from a CSV or JSON file (dry run unless --apply)."""
+        import csv
+        import os
+        import sys
+        import time
+        from user_import import UserImportError, parse_user_file, plan_import, provision_users
+
+        with open(path, 'rb') as fh:
+            try:
+                entries = parse_user_file(os.path.basename(path), fh.read())
+            except (UserImportError, UnicodeDecodeError) as e:
+                print(f"Error: {e}")
+                raise SystemExit(1)
+
+        report = plan_import(entries)
+        for error in report['errors']:
+            print(f"! {error}")
+        roles = ", ".join(f"{count} {role}" for role, count in report['roles'].items())
+        print(f"{len(report['new'])} users to create ({roles or 'none'}), {len(report['errors'])} with problems.")
+        if report['errors']:
+            raise SystemExit(1)
+        if not apply_changes:
+            print("Dry run only; run again with --apply to create the users.")
+            return
+
+        start = time.perf_counter()
+        created = provision_users(report['new'])
+        print(f"Created {len(created)} users in {time.perf_counter() - start:.1f}s.")
+        out = open(credentials, 'w', newline='') if credentials else sys.stdout
+        try:
+            writer = csv.writer(out)
+            writer.writerow(['email', 'temporary_password'])
+            writer.writerows((entry.email, password) for entry, password in created)
+        finally:
+            if credentials:
+                out.close()
+                print(f"Temporary passwords written to {credentials}.")
+
+    @app.cli.command("chat-prune")
+    def chat_prune():
+        """Deletes chat conversations idle for longer than CHAT_HISTORY_TTL."""
+        from chat_history import prune_conversations
+
+        removed = prune_conversations()
+        print(f"Removed {removed} idle chat conversations.")
+
     return app
 
 # Create app instance for gunicorn
@@ -0,0 +1,260 @@
+"""
+Route benchmark suite.
+
+Drives the real Flask app through the test client against the configured
+database (normally one filled with `flask db-seed-synthetic`) and reports,
+per route, p50/p95 latency, SQL query count and peak Python memory.
+
+    python benchmark.py --iterations 20
+    python benchmark.py --json bench.json                 # save results
+    python benchmark.py --baseline bench.json --tolerance 0.25
+        # exit 1 if any route's p95 or query count regressed by more than 25%
+
+The users it logs in as are picked from the synthetic org: the manager with
+the most direct reports, one of their employees, and the synthetic admin.
+
+With --chat N it instead load-tests the chatbot: N concurrent employees send
+chat messages through the fake LLM backend (llm_fake.py, no live service
+needed) and it reports throughput, latency, busy (503) replies, SQL queries
+per turn and peak chat pool occupancy.
+
+    python benchmark.py --chat 8 --turns 10 --llm-latency-ms 800
+    python benchmark.py --chat 8 --stream     # use /employee/chat/stream
+"""
+import argparse
+import datetime
+import json
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+from app import app
+from extensions import db
+from models import User, UserRole, Leave
+from seed_synthetic import EMAIL_DOMAIN, SYNTHETIC_PASSWORD
+
+# Messages each simulated employee cycles through in --chat mode. They trigger a
+# plain reply and a suggest_leave_dates tool call under the default fake script.
+CHAT_MESSAGES = ["Hi Leavy!", "When is a good time for a 2-day vacation?"]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args, **kwargs):
+        self.count += 1
+
+
+def _pick_users():
+    manager_id = db.session.query(User.manager_id).filter(
+        User.role == UserRole.EMPLOYEE, User.email.like(f'%@{EMAIL_DOMAIN}')
+    ).group_by(User.manager_id).order_by(func.count(User.id).desc()).limit(1).scalar()
+    if manager_id is None:
+        raise SystemExit("No synthetic org found. Run 'flask db-seed-synthetic' first.")
+    manager = db.session.get(User, manager_id)
+    employee_id = db.session.query(Leave.user_id).join(User, User.id == Leave.user_id).filter(
+        User.manager_id == manager_id
+    ).group_by(Leave.user_id).order_by(func.count(Leave.id).desc()).limit(1).scalar()
+    employee = db.session.get(User, employee_id)
+    admin = User.query.filter_by(email=f'admin@{EMAIL_DOMAIN}').first()
+    return employee.email, manager.email, admin.email
+
+
+def _routes():
+    today = datetime.date.today()
+    month_start = today.replace(day=1)
+    window = f'start={month_start - datetime.timedelta(days=7)}&end={month_start + datetime.timedelta(days=42)}'
+    return [
+        ('employee', 'employee.dashboard', '/employee/dashboard'),
+        ('employee', 'employee.get_leaves_for_calendar', f'/employee/get_leaves_for_calendar?{window}'),
+        ('manager', 'manager.dashboard', '/manager/dashboard'),
+        ('manager', 'manager.get_team_leaves_for_calendar', f'/manager/get_team_leaves_for_calendar?{window}'),
+        ('manager', 'manager.export_team_leaves (html)', '/manager/export_team_leaves?filter_type=all'),
+        ('manager', 'manager.export_team_leaves (csv)', '/manager/export_team_leaves?filter_type=all&format=csv'),
+        ('admin', 'admin.manage_users', '/admin/users'),
+    ]
+
+
+def _login(email):
+    client = app.test_client()
+    response = client.post('/login', data={'email': email, 'password': SYNTHETIC_PASSWORD})
+    if response.status_code != 302:
+        raise SystemExit(f'Could not log in as {email} (status {response.status_code}).')
+    return client
+
+
+def run(iterations, warmup):
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    counter = QueryCounter()
+
+    with app.app_context():
+        employee_email, manager_email, admin_email = _pick_users()
+    clients = {
+        'employee': _login(employee_email),
+        'manager': _login(manager_email),
+        'admin': _login(admin_email),
+    }
+
+    results = {}
+    for role, name, url in _routes():
+        client = clients[role]
+        for _ in range(warmup):
+            client.get(url).close()
+
+        latencies, query_counts, peaks = [], [], []
+        for _ in range(iterations):
+            tracemalloc.start()
+            counter.count = 0
+            started = time.perf_counter()
+            response = client.get(url)
+            body_size = sum(len(chunk) for chunk in response.iter_encoded())  # drains streamed responses chunk by chunk
+            latencies.append((time.perf_counter() - started) * 1000)
+            query_counts.append(counter.count)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            if response.status_code != 200:
+                raise SystemExit(f'{name} returned {response.status_code}')
+
+        results[name] = {
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p95_ms': round(_percentile(latencies, 95), 2),
+            'queries': max(query_counts),
+            'peak_kib': round(max(peaks) / 1024, 1),
+            'bytes': body_size,
+        }
+    return results
+
+
+def _chat_employees(count):
+    emails = [email for (email,) in db.session.query(User.email).filter(
+        User.role == UserRole.EMPLOYEE, User.email.like(f'%@{EMAIL_DOMAIN}')
+    ).order_by(User.id).limit(count)]
+    if len(emails) < count:
+        raise SystemExit("Not enough synthetic employees. Run 'flask db-seed-synthetic' first.")
+    return emails
+
+
+def run_chat(concurrency, turns, stream, latency_ms):
+    """Sends `turns` chat messages from each of `concurrency` employees at once."""
+    import llm
+    from chat_pool import get_chat_pool
+
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, LLM_BACKEND='fake', LLM_FAKE_LATENCY_MS=latency_ms)
+    llm._client = None  # Pick up the fake backend even if a client already exists
+    counter = QueryCounter()
+
+    with app.app_context():
+        emails = _chat_employees(concurrency)
+        pool = get_chat_pool()
+    clients = [_login(email) for email in emails]
+    url = '/employee/chat/stream' if stream else '/employee/chat'
+
+    latencies, statuses = [], []
+    lock = threading.Lock()
+
+    def employee(client):
+        for turn in range(turns):
+            started = time.perf_counter()
+            response = client.post(url, json={"message": CHAT_MESSAGES[turn % len(CHAT_MESSAGES)]})
+            body = response.get_data(as_text=True)  # Streams are read to the end
+            status = response.status_code
+            if status == 200 and stream and 'event: done' not in body:
+                status = 500
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses.append(status)
+
+    counter.count = 0
+    started = time.perf_counter()
+    threads = [threading.Thread(target=employee, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ok = statuses.count(200)
+    return {
+        'turns': len(statuses),
+        'ok': ok,
+        'busy_503': statuses.count(503),
+        'errors': len(statuses) - ok - statuses.count(503),
+        'turns_per_s': round(ok / elapsed, 2),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(_percentile(latencies, 95), 2),
+        'queries_per_turn': round(counter.count / max(ok, 1), 1),
+        'pool_peak': pool.peak_in_use,
+        'pool_capacity': pool.capacity,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of human-readable regressions against a saved baseline."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ('p95_ms', 'queries'):
+            if previous[metric] and current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(f'{name}: {metric} {previous[metric]} -> {current[metric]}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--json', dest='json_path', help='Write results to this JSON file.')
+    parser.add_argument('--baseline', help='Compare against results saved with --json.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative regression (default 0.25).')
+    parser.add_argument('--chat', type=int, metavar='N', help='Load-test the chatbot with N concurrent employees instead.')
+    parser.add_argument('--turns', type=int, default=10, help='Chat messages per employee in --chat mode (default 10).')
+    parser.add_argument('--stream', action='store_true', help='Use the streaming chat endpoint in --chat mode.')
+    parser.add_argument('--llm-latency-ms', type=int, default=500, help='Fake LLM time per completion (default 500).')
+    args = parser.parse_args(argv)
+
+    if args.chat:
+        result = run_chat(args.chat, args.turns, args.stream, args.llm_latency_ms)
+        for key, value in result.items():
+            print(f"{key:<18} {value}")
+        if args.json_path:
+            with open(args.json_path, 'w') as fh:
+                json.dump(result, fh, indent=2)
+        return 0
+
+    results = run(args.iterations, args.warmup)
+
+    print(f"{'route':<45} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'peak KiB':>10} {'bytes':>10}")
+    for name, r in results.items():
+        print(f"{name:<45} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['queries']:>8} {r['peak_kib']:>10} {r['bytes']:>10}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        if regressions:
+            print('\nRegressions:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
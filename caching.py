@@ -0,0 +1,171 @@
+"""
+Small key/value cache with pluggable backends.
+
+- MemoryCache: in-process LRU with a per-entry TTL. Cheapest, but every
+  gunicorn worker has its own copy, so invalidations only reach this process.
+- FileCache: JSON files in a shared directory. Every worker on the host reads
+  and invalidates the same entries, at the cost of a small file read per hit.
+  Expired files are swept out periodically.
+
+Values must be JSON-serializable so both backends behave the same.
+The backend is chosen with the CACHE_BACKEND setting ('memory' or 'filesystem').
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCache:
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCache:
+    def __init__(self, directory, default_ttl=300, sweep_interval=600):
+        self.directory = directory
+        self.default_ttl = default_ttl
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as fh:
+                entry = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != key:
+            return None
+        if entry.get('expires_at', 0) < time.time():
+            self._remove(path)
+            return None
+        return entry.get('value')
+
+    def set(self, key, value, ttl=None):
+        entry = {
+            'key': key,
+            'expires_at': time.time() + (ttl if ttl is not None else self.default_ttl),
+            'value': value,
+        }
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                json.dump(entry, fh)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if time.monotonic() >= self._next_sweep:
+            self.sweep()
+
+    def delete(self, key):
+        self._remove(self._path(key))
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                self._remove(os.path.join(self.directory, name))
+
+    def sweep(self):
+        """
+        Deletes expired entries (most are never read again, so get() alone would
+        leave them behind) and temp files orphaned by a crashed writer. Called
+        from set() at most once per sweep_interval per process. Returns the
+        number of files removed.
+        """
+        self._next_sweep = time.monotonic() + self.sweep_interval
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith('.tmp'):
+                    expired = os.path.getmtime(path) < now - self.sweep_interval
+                elif name.endswith('.json'):
+                    with open(path, 'r', encoding='utf-8') as fh:
+                        expired = json.load(fh).get('expires_at', 0) < now
+                else:
+                    continue
+            except (OSError, ValueError):
+                continue  # Removed by another worker, or mid-replace
+            if expired and self._remove(path):
+                removed += 1
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class Cache:
+    """Flask extension wrapper that picks the backend from the app config."""
+
+    def __init__(self):
+        self.backend = MemoryCache()
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        if backend == 'filesystem':
+            directory = app.config.get('CACHE_DIR') or os.path.join(app.instance_path, 'cache')
+            self.backend = FileCache(directory, default_ttl=ttl)
+        elif backend == 'memory':
+            self.backend = MemoryCache(max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024), default_ttl=ttl)
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND '{backend}' (expected 'memory' or 'filesystem')")
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def clear(self):
+        self.backend.clear()
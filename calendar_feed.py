@@ -0,0 +1,165 @@
+"""
+Shared response logic for the FullCalendar JSON feeds.
+
+Full mode (default) returns the plain event list FullCalendar expects.
+
+Delta mode (?delta=1&cursor=...) returns only what changed since the cursor:
+    {
+        "events":   [...],        # new or updated leave events in the window
+        "deleted":  [leave ids],  # leaves deleted since the cursor
+        "holidays": [...] | null, # full holiday list when it changed, else null
+        "cursor":   "...",        # pass back on the next request
+        "reset":    bool          # true: replace everything instead of merging
+    }
+A missing or stale cursor (different team, renamed users, ...) yields a reset.
+
+Both modes send a strong ETag derived from the viewer and cheap aggregates
+over the window, so an unchanged window is answered with 304 before any
+event is built.
+"""
+import base64
+import datetime
+import hashlib
+import json
+from flask import jsonify, request, make_response
+from flask_login import current_user
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from extensions import db
+from models import Leave, LeaveTombstone
+from holiday_index import get_holiday_index, HOLIDAY_VERSION_KEY
+from utils import get_data_version
+
+USERS_VERSION_KEY = 'users'
+
+# Changes committed slightly after a row's updated_at was stamped would be missed
+# by a strict "> cursor" comparison, so deltas re-send a short overlap window.
+DELTA_OVERLAP = datetime.timedelta(seconds=60)
+
+
+def parse_calendar_range(args):
+    """Start/end dates of the window FullCalendar asks for, or (None, None)."""
+    start_str = args.get('start')
+    end_str = args.get('end')
+
+    start_date = datetime.datetime.fromisoformat(start_str.replace('Z', '+00:00')).date() if start_str else None
+    end_date = datetime.datetime.fromisoformat(end_str.replace('Z', '+00:00')).date() if end_str else None
+    return start_date, end_date
+
+
+def holiday_events(start_date=None, end_date=None):
+    index = get_holiday_index()
+    entries = index.between(start_date, end_date) if start_date and end_date else index.entries
+
+    events = []
+    for holiday in entries:
+        if holiday.is_critical:
+            # CRITICAL DAYS (no leave allowed)
+            title = f'{holiday.name} (Critical Day)'
+            color = '#f8d7da' # A light, cautionary red
+        else:
+            # HOLIDAYS (days off)
+            title = f'{holiday.name} (Holiday)'
+            color = '#ced4da' # A neutral grey for days off
+        events.append({
+            'id': f'holiday-{holiday.date.isoformat()}',
+            'title': title,
+            'start': holiday.date.isoformat(),
+            'end': (holiday.date + datetime.timedelta(days=1)).isoformat(),
+            'backgroundColor': color,
+            'borderColor': color,
+            'display': 'background',
+        })
+    return events
+
+
+def _encode_cursor(stamp, holiday_version, users_version, scope):
+    raw = json.dumps([stamp.isoformat() if stamp else None, holiday_version, users_version, scope])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    try:
+        stamp, holiday_version, users_version, scope = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        stamp = datetime.datetime.fromisoformat(stamp) if stamp else None
+        return stamp, holiday_version, users_version, scope
+    except (ValueError, TypeError):
+        return None
+
+
+def _load_leaves(query):
+    # Event titles use the employee name; load it in the same SELECT
+    return query.options(joinedload(Leave.employee)).all()
+
+
+def calendar_feed_response(user_ids, start_date, end_date, leave_event, scope=None):
+    """
+    Builds the (conditional) feed response for the leaves of user_ids overlapping
+    [start_date, end_date]. leave_event(leave) turns one Leave into an event dict.
+    user_ids is a list of ids, or a SELECT of ids together with a `scope` label
+    naming that selection (e.g. 'subtree:42'); membership changes are covered
+    by the users version.
+    """
+    delta_mode = request.args.get('delta') == '1'
+    cursor_param = request.args.get('cursor', '')
+
+    if scope is None:
+        user_ids = sorted(set(user_ids))
+        scope = hashlib.sha1(','.join(map(str, user_ids)).encode('ascii')).hexdigest()[:16]
+
+    leaves_query = Leave.query.filter(Leave.user_id.in_(user_ids))
+    if start_date and end_date:
+        leaves_query = leaves_query.filter(Leave.start_date <= end_date, Leave.end_date >= start_date)
+
+    leave_count, last_updated = leaves_query.with_entities(func.count(Leave.id), func.max(Leave.updated_at)).one()
+    # Only deletions within the scope; deleting a user also bumps the users version (a reset)
+    tombstones = db.session.query(LeaveTombstone).filter(LeaveTombstone.user_id.in_(user_ids))
+    last_deleted = tombstones.with_entities(func.max(LeaveTombstone.deleted_at)).scalar()
+    holiday_version = get_data_version(HOLIDAY_VERSION_KEY)
+    users_version = get_data_version(USERS_VERSION_KEY)
+
+    # Events are rendered per viewer (is_mine, colours), so the viewer is part of the ETag
+    fingerprint = '|'.join(str(part) for part in (
+        current_user.id, 'delta' if delta_mode else 'full', cursor_param, scope, start_date, end_date,
+        leave_count, last_updated, last_deleted, holiday_version, users_version,
+    ))
+    etag = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    elif not delta_mode:
+        response = jsonify([leave_event(leave) for leave in _load_leaves(leaves_query)] + holiday_events(start_date, end_date))
+    else:
+        stamps = [s for s in (last_updated, last_deleted) if s]
+        next_cursor = _encode_cursor(max(stamps) if stamps else None, holiday_version, users_version, scope)
+        previous = _decode_cursor(cursor_param) if cursor_param else None
+
+        if previous is None or previous[2] != users_version or previous[3] != scope:
+            payload = {
+                'events': [leave_event(leave) for leave in _load_leaves(leaves_query)],
+                'deleted': [],
+                'holidays': holiday_events(start_date, end_date),
+                'reset': True,
+            }
+        else:
+            since, previous_holiday_version = previous[0], previous[1]
+            changed, deleted = leaves_query, []
+            if since:
+                since = since - DELTA_OVERLAP
+                changed = leaves_query.filter(Leave.updated_at >= since)
+                deleted = [leave_id for (leave_id,) in tombstones.with_entities(LeaveTombstone.leave_id).filter(
+                    LeaveTombstone.deleted_at >= since
+                ).all()]
+            payload = {
+                'events': [leave_event(leave) for leave in _load_leaves(changed)],
+                'deleted': deleted,
+                'holidays': holiday_events(start_date, end_date) if previous_holiday_version != holiday_version else None,
+                'reset': False,
+            }
+        payload['cursor'] = next_cursor
+        response = jsonify(payload)
+
+    response.set_etag(etag)
+    # Always revalidate: the browser may reuse its copy only after a 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,102 @@
+"""
+Server-side storage for Leavy chat conversations.
+
+Turns are kept in the ChatConversation table; the session only holds the
+conversation id. The system prompt is rebuilt on every turn and never stored.
+Older turns are dropped once the history exceeds CHAT_HISTORY_TOKEN_BUDGET,
+so the prompt sent to the model (and its latency and cost) stays bounded.
+"""
+import datetime
+import json
+from flask import current_app, session
+from flask_login import current_user
+from extensions import db
+from models import ChatConversation
+
+SESSION_KEY = 'chat_conversation_id'
+
+# Rough token estimate: about four characters per token for English text,
+# plus a few tokens of per-message overhead.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(message):
+    content = message.get("content") or ""
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    size = len(content)
+    for tool_call in message.get("tool_calls") or []:
+        size += len(tool_call["function"]["name"]) + len(tool_call["function"]["arguments"] or "")
+    return size // CHARS_PER_TOKEN + MESSAGE_OVERHEAD_TOKENS
+
+
+def trim_to_budget(messages, budget):
+    """
+    Drops the oldest turns until the history fits the token budget. A turn is
+    a user message plus the assistant/tool messages that answer it, so tool
+    results are never separated from the call that produced them. The latest
+    turn is always kept.
+    """
+    turns = []
+    for message in messages:
+        if message["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+
+    sizes = [sum(estimate_tokens(m) for m in turn) for turn in turns]
+    total = sum(sizes)
+    start = 0
+    while total > budget and start < len(turns) - 1:
+        total -= sizes[start]
+        start += 1
+    return [message for turn in turns[start:] for message in turn]
+
+
+def _load_conversation():
+    conversation_id = session.get(SESSION_KEY)
+    if conversation_id is None:
+        return None
+    conversation = ChatConversation.query.filter_by(id=conversation_id, user_id=current_user.id).first()
+    if conversation is None:
+        return None
+    expires = datetime.timedelta(seconds=current_app.config['CHAT_HISTORY_TTL'])
+    if conversation.updated_at < datetime.datetime.utcnow() - expires:
+        return None  # Stale conversation; start a fresh one
+    return conversation
+
+
+def get_history(system_prompt):
+    """
+    Returns the current conversation, system prompt first. Starts a new
+    conversation (and stores its id in the session) if there is none yet, so
+    the id goes out with this response even when the reply is streamed.
+    """
+    conversation = _load_conversation()
+    if conversation is None:
+        conversation = ChatConversation(user_id=current_user.id, messages=[])
+        db.session.add(conversation)
+        db.session.commit()
+        session[SESSION_KEY] = conversation.id
+
+    history = trim_to_budget(conversation.messages, current_app.config['CHAT_HISTORY_TOKEN_BUDGET'])
+    return [{"role": "system", "content": system_prompt}] + history
+
+
+def save_history(messages):
+    """Stores the conversation's turns (trimmed to the token budget) without the system prompt."""
+    conversation = _load_conversation()
+    if conversation is None:
+        return
+    turns = [message for message in messages if message["role"] != "system"]
+    conversation.messages = trim_to_budget(turns, current_app.config['CHAT_HISTORY_TOKEN_BUDGET'])
+    conversation.updated_at = datetime.datetime.utcnow()
+    db.session.commit()
+
+
+def prune_conversations():
+    """Deletes conversations idle for longer than CHAT_HISTORY_TTL. Returns the number removed."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=current_app.config['CHAT_HISTORY_TTL'])
+    removed = ChatConversation.query.filter(ChatConversation.updated_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
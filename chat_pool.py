@@ -0,0 +1,132 @@
+"""
+Bounded execution pool for chatbot requests.
+
+A chat turn waits on up to two remote completions, which can take many
+seconds, and its request thread stays blocked until the turn is done.
+Unbounded, a few chatting employees could tie up every web thread and stall
+ordinary page requests. Chat work therefore goes through a small, separately
+sized thread pool per process that caps how many turns are in flight:
+
+- at most CHAT_WORKERS turns talk to the LLM at once,
+- at most CHAT_QUEUE_DEPTH more wait for a free slot,
+- anything beyond that is rejected straight away (the route answers 503
+  with Retry-After) instead of queueing without limit.
+
+The pool does not free the request thread: it waits on the turn's result.
+What it bounds is how many request threads chat can hold at once, so
+CHAT_WORKERS + CHAT_QUEUE_DEPTH should stay below the gunicorn thread count
+(see gunicorn.conf.py) to leave threads for page requests.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import copy_current_request_context, current_app, g
+
+_pool = None
+_lock = threading.Lock()
+
+_END = object()
+
+
+class ChatPoolSaturated(Exception):
+    """Raised when every chat slot, running or queued, is taken."""
+
+
+class ChatPool:
+    def __init__(self, workers, queue_depth, timeout):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chat')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self.capacity = workers + queue_depth
+        # Slots taken right now and the most ever taken at once (for benchmarks)
+        self.in_use = 0
+        self.peak_in_use = 0
+        self._count_lock = threading.Lock()
+
+    def _take_slot(self):
+        if not self._slots.acquire(blocking=False):
+            raise ChatPoolSaturated()
+        with self._count_lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def _release_slot(self):
+        with self._count_lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def _submit(self, fn):
+        self._take_slot()
+
+        # Run inside a copy of the current request context (current_user,
+        # config, db session) and keep adding LLM time to this request's stats.
+        request_stats = g.get('_request_stats')
+
+        @copy_current_request_context
+        def task():
+            if request_stats is not None:
+                g._request_stats = request_stats
+            return fn()
+
+        try:
+            future = self._executor.submit(task)
+        except Exception:
+            self._release_slot()
+            raise
+        future.add_done_callback(lambda f: self._release_slot())
+        return future
+
+    def run(self, fn):
+        """Runs fn() on the pool and returns its result. Raises ChatPoolSaturated if full."""
+        return self._submit(fn).result(timeout=self.timeout)
+
+    def stream(self, generator_fn):
+        """
+        Runs generator_fn() on the pool and returns a generator yielding its
+        items as they are produced. Raises ChatPoolSaturated if full.
+        """
+        items = queue.Queue(maxsize=64)
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                for item in generator_fn():
+                    while not cancelled.is_set():
+                        try:
+                            items.put(item, timeout=1)
+                            break
+                        except queue.Full:
+                            continue
+                    if cancelled.is_set():
+                        return  # Client went away; stop calling the LLM
+            finally:
+                if not cancelled.is_set():
+                    items.put(_END)
+
+        self._submit(produce)
+
+        def consume():
+            try:
+                while True:
+                    try:
+                        item = items.get(timeout=self.timeout)
+                    except queue.Empty:
+                        return  # Producer stalled past the request timeout
+                    if item is _END:
+                        return
+                    yield item
+            finally:
+                cancelled.set()
+
+        return consume()
+
+
+def get_chat_pool():
+    """Returns this process's chat pool, creating it on first use (after gunicorn forks)."""
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                config = current_app.config
+                _pool = ChatPool(config['CHAT_WORKERS'], config['CHAT_QUEUE_DEPTH'], config['CHAT_REQUEST_TIMEOUT'])
+    return _pool
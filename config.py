@@ -6,4 +6,35 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'static/uploads'
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', '16000000')) # 16 MB default
-    ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif'} # For attachments
\ No newline at end of file
+    ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif'} # For attachments
+    # 'memory' (per-process LRU) or 'filesystem' (shared across gunicorn workers)
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'memory'
+    CACHE_DIR = os.environ.get('CACHE_DIR') # Defaults to <instance>/cache for the filesystem backend
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', '300')) # seconds
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '1024'))
+    # Per-request SQL/template/LLM timings (Server-Timing header, JSON logs, /metrics)
+    INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+    INSTRUMENTATION_SLOW_QUERIES = int(os.environ.get('INSTRUMENTATION_SLOW_QUERIES', '3')) # slowest statements to log
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') # If set, /metrics requires 'Authorization: Bearer <token>'
+    # Chatbot LLM client (one pooled client per worker process)
+    LLM_BACKEND = os.environ.get('LLM_BACKEND') or 'azure' # 'azure' or 'fake' (llm_fake.py, for load tests)
+    LLM_FAKE_SCRIPT = os.environ.get('LLM_FAKE_SCRIPT') # JSON reply script for the fake backend
+    LLM_FAKE_LATENCY_MS = int(os.environ.get('LLM_FAKE_LATENCY_MS', '0')) # simulated time per completion
+    LLM_FAKE_CHUNK_MS = int(os.environ.get('LLM_FAKE_CHUNK_MS', '0')) # simulated delay between streamed chunks
+    LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', '10'))
+    LLM_KEEPALIVE_SECONDS = float(os.environ.get('LLM_KEEPALIVE_SECONDS', '120'))
+    LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', '60'))
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '2'))
+    CHAT_HISTORY_TTL = int(os.environ.get('CHAT_HISTORY_TTL', '86400')) # seconds an idle conversation is kept
+    CHAT_HISTORY_TOKEN_BUDGET = int(os.environ.get('CHAT_HISTORY_TOKEN_BUDGET', '3000')) # older turns are dropped beyond this
+    # Bounded chat execution pool (per worker process); see chat_pool.py
+    CHAT_WORKERS = int(os.environ.get('CHAT_WORKERS', '3')) # chat turns talking to the LLM at once
+    CHAT_QUEUE_DEPTH = int(os.environ.get('CHAT_QUEUE_DEPTH', '2')) # chat turns allowed to wait for a slot
+    CHAT_REQUEST_TIMEOUT = float(os.environ.get('CHAT_REQUEST_TIMEOUT', '150')) # seconds before a waiting chat gives up
+    CHAT_RETRY_AFTER = int(os.environ.get('CHAT_RETRY_AFTER', '5')) # Retry-After seconds sent with a 503
+    # Bulk user import (user_import.py)
+    USER_IMPORT_HASH_WORKERS = int(os.environ.get('USER_IMPORT_HASH_WORKERS', '0')) # password hashing processes; 0 = one per CPU
+    USER_IMPORT_BATCH_SIZE = int(os.environ.get('USER_IMPORT_BATCH_SIZE', '500')) # users inserted per transaction
+    # Team coverage check on leave applications (team_coverage.py)
+    TEAM_COVERAGE_MODE = (os.environ.get('TEAM_COVERAGE_MODE') or 'warn').lower() # 'warn', 'block' or 'off'
+    TEAM_COVERAGE_MAX_ABSENT_SHARE = float(os.environ.get('TEAM_COVERAGE_MAX_ABSENT_SHARE', '0.5')) # share of a team that may be out at once
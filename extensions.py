@@ -1,10 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from caching import Cache
+from instrumentation import Instrumentation
 
 db = SQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
+cache = Cache()
+instrumentation = Instrumentation()
 
 login_manager.login_view = 'auth.login'
 login_manager.login_message_category = 'info'
\ No newline at end of file
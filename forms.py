@@ -1,9 +1,9 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, SelectField, DateField, TextAreaField, FileField, IntegerField
+from wtforms import StringField, PasswordField, SubmitField, SelectField, DateField, TextAreaField, FileField, IntegerField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, Optional, InputRequired
 from models import User, UserRole, LeaveType
 from wtforms.widgets import DateInput
-from flask_wtf.file import FileAllowed
+from flask_wtf.file import FileAllowed, FileRequired
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -44,6 +44,22 @@ class HolidayForm(FlaskForm):
     is_critical = SelectField('Is Critical Day?', choices=[('False', 'No'), ('True', 'Yes')], validators=[InputRequired()], coerce=lambda x: x == 'True')
     submit = SubmitField('Save Holiday')
 
+class HolidayImportForm(FlaskForm):
+    file = FileField('Holiday File (.csv or .ics)', validators=[FileRequired(), FileAllowed(['csv', 'ics'], 'CSV or iCalendar files only!')])
+    submit = SubmitField('Preview Import')
+
+class HolidayImportConfirmForm(FlaskForm):
+    payload = HiddenField(validators=[DataRequired()]) # The parsed holidays, as JSON
+    submit = SubmitField('Confirm Import')
+
+class UserImportForm(FlaskForm):
+    file = FileField('User File (.csv or .json)', validators=[FileRequired(), FileAllowed(['csv', 'json'], 'CSV or JSON files only!')])
+    submit = SubmitField('Dry Run')
+
+class UserImportConfirmForm(FlaskForm):
+    token = HiddenField(validators=[DataRequired()]) # Key of the validated users, kept server-side
+    submit = SubmitField('Create Users')
+
 class LeaveApplicationForm(FlaskForm):
     leave_type = SelectField('Leave Type', choices=[(lt.name, lt.value) for lt in LeaveType], validators=[DataRequired()])
     start_date = DateField('Start Date', format='%Y-%m-%d', validators=[DataRequired()], widget=DateInput())
@@ -0,0 +1,22 @@
+# Gunicorn settings (used by render.yaml: gunicorn -c gunicorn.conf.py app:app)
+#
+# Threaded workers let page requests keep flowing while chat requests wait on
+# the LLM. Each process runs at most CHAT_WORKERS chats plus CHAT_QUEUE_DEPTH
+# waiting ones (chat_pool.py); keep their sum below `threads` so the rest of the
+# threads stay free for ordinary pages.
+import os
+
+# Several worker processes: with the per-process memory cache every worker would
+# build its own copy of each cached summary, and invalidate_team_summary() would
+# only clear the copy of the worker that handled the change, leaving the others
+# stale until their TTL. A shared filesystem cache avoids both.
+os.environ.setdefault('CACHE_BACKEND', 'filesystem')
+
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+# Chat turns can legitimately take a while; streamed replies keep the connection busy
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '180'))
+graceful_timeout = 30
+keepalive = 5
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
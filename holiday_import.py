@@ -0,0 +1,182 @@
+"""
+Bulk holiday import from CSV or iCalendar (.ics) files.
+
+    date,name,is_critical
+    2027-01-01,New Year's Day,no
+    2027-03-31,Quarter-end close,yes
+
+CSV files need a header with `date` and `name` columns; `is_critical` is
+optional (yes/true/1 mark a critical day). In .ics files every VEVENT's
+DTSTART date (each day of a multi-day all-day event) becomes a holiday
+named after its SUMMARY; a CATEGORIES value containing "critical" marks a
+critical day.
+
+Importing is an upsert on the holiday date: new dates are inserted, existing
+ones get the imported name and critical flag, and nothing is deleted.
+diff_holidays() previews the changes; apply_import() stages them, bumps the
+holiday version once and re-derives the affected leave balances, all in the
+caller's transaction.
+"""
+import csv
+import datetime
+from io import StringIO
+from extensions import db
+from models import Holiday
+from holiday_index import HolidayEntry, invalidate_holiday_index
+import ledger
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'critical'}
+
+
+class HolidayImportError(ValueError):
+    """Raised when a file cannot be parsed; the message lists the offending lines."""
+
+
+def _parse_date(value):
+    value = value.strip()
+    for fmt in ('%Y-%m-%d', '%m/%d/%Y'):
+        try:
+            return datetime.datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date '{value}' (use YYYY-MM-DD)")
+
+
+def parse_holidays_csv(text):
+    reader = csv.DictReader(StringIO(text))
+    fields = {(name or '').strip().lower(): name for name in reader.fieldnames or []}
+    if 'date' not in fields or 'name' not in fields:
+        raise HolidayImportError("The CSV needs a header row with 'date' and 'name' columns.")
+
+    entries, errors = [], []
+    for line_no, row in enumerate(reader, start=2):
+        raw_date = (row.get(fields['date']) or '').strip()
+        name = (row.get(fields['name']) or '').strip()
+        if not raw_date and not name:
+            continue  # blank line
+        critical = (row.get(fields['is_critical']) or '') if 'is_critical' in fields else ''
+        try:
+            entries.append(HolidayEntry(_parse_date(raw_date), _check_name(name), critical.strip().lower() in TRUE_VALUES))
+        except ValueError as e:
+            errors.append(f"Line {line_no}: {e}")
+    return _checked(entries, errors)
+
+
+def _unfold_ics(text):
+    lines = []
+    for line in text.splitlines():
+        if line[:1] in (' ', '\t') and lines:
+            lines[-1] += line[1:]  # RFC 5545 folded continuation line
+        else:
+            lines.append(line)
+    return lines
+
+
+def _unescape_ics(value):
+    return value.replace('\\n', ' ').replace('\\N', ' ').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+
+def _ics_date(value):
+    return datetime.datetime.strptime(value.strip()[:8], '%Y%m%d').date()
+
+
+def parse_holidays_ics(text):
+    entries, errors = [], []
+    event = None
+    for line_no, line in enumerate(_unfold_ics(text), start=1):
+        if line == 'BEGIN:VEVENT':
+            event = {'line': line_no}
+            continue
+        if event is None:
+            continue
+        if line == 'END:VEVENT':
+            try:
+                if 'DTSTART' not in event:
+                    raise ValueError("event has no DTSTART")
+                start = _ics_date(event['DTSTART'][1])
+                end = start + datetime.timedelta(days=1)
+                # All-day events end on the (exclusive) DTEND date
+                if 'DTEND' in event and 'VALUE=DATE' in event['DTEND'][0]:
+                    end = max(end, _ics_date(event['DTEND'][1]))
+                name = _check_name(_unescape_ics(event.get('SUMMARY', ('', ''))[1]).strip())
+                critical = 'critical' in event.get('CATEGORIES', ('', ''))[1].lower()
+                day = start
+                while day < end:
+                    entries.append(HolidayEntry(day, name, critical))
+                    day += datetime.timedelta(days=1)
+            except ValueError as e:
+                errors.append(f"Event at line {event['line']}: {e}")
+            event = None
+            continue
+        key, sep, value = line.partition(':')
+        if sep:
+            prop, _, params = key.partition(';')
+            event[prop.upper()] = (params.upper(), value)
+    return _checked(entries, errors)
+
+
+def _check_name(name):
+    if not 2 <= len(name) <= 100:
+        raise ValueError("holiday name must be 2 to 100 characters")
+    return name
+
+
+def _checked(entries, errors):
+    seen = {}
+    for entry in entries:
+        if entry.date in seen and seen[entry.date] != entry:
+            errors.append(f"{entry.date.isoformat()} appears more than once with different details")
+        seen[entry.date] = entry
+    if errors:
+        raise HolidayImportError("\n".join(errors))
+    return sorted(seen.values(), key=lambda e: e.date)
+
+
+def parse_holiday_file(filename, data):
+    """Parses an uploaded file's bytes by extension (.csv or .ics)."""
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return parse_holidays_csv(text)
+    if extension in ('ics', 'ical'):
+        return parse_holidays_ics(text)
+    raise HolidayImportError("Only .csv and .ics files can be imported.")
+
+
+def diff_holidays(entries):
+    """
+    Compares parsed entries with the Holiday table in one query. Returns
+    {'added': [entry], 'updated': [(Holiday, entry)], 'unchanged': [entry]}.
+    """
+    existing = {}
+    if entries:
+        existing = {h.date: h for h in Holiday.query.filter(Holiday.date.in_([e.date for e in entries]))}
+    diff = {'added': [], 'updated': [], 'unchanged': []}
+    for entry in entries:
+        holiday = existing.get(entry.date)
+        if holiday is None:
+            diff['added'].append(entry)
+        elif holiday.name != entry.name or bool(holiday.is_critical) != entry.is_critical:
+            diff['updated'].append((holiday, entry))
+        else:
+            diff['unchanged'].append(entry)
+    return diff
+
+
+def apply_import(diff):
+    """
+    Stages the inserts and updates of a diff, bumps the holiday version once
+    and re-derives leave balances on the changed dates. The caller commits.
+    Returns the number of holidays written.
+    """
+    if not diff['added'] and not diff['updated']:
+        return 0
+    db.session.bulk_insert_mappings(Holiday, [
+        {'date': e.date, 'name': e.name, 'is_critical': e.is_critical} for e in diff['added']
+    ])
+    db.session.bulk_update_mappings(Holiday, [
+        {'id': holiday.id, 'name': e.name, 'is_critical': e.is_critical} for holiday, e in diff['updated']
+    ])
+    invalidate_holiday_index()
+    ledger.refresh_for_holiday_dates([e.date for e in diff['added']] + [e.date for _, e in diff['updated']])
+    return len(diff['added']) + len(diff['updated'])
@@ -0,0 +1,95 @@
+"""
+Process-wide in-memory index of holidays and critical days.
+
+Leave validation needs "is any day in [start, end] blocked?". Instead of a
+query per day, the holiday table is loaded once into a sorted array of date
+ordinals and answered with a single bisect.
+
+The index is tagged with the 'holidays' DataVersion. Admin holiday changes bump
+that version in the same transaction, and every worker compares versions (one
+primary-key lookup) before using its copy, so edits reach all workers on their
+next request. Within a transaction that changed holidays (see
+invalidate_holiday_index) the index is built from the session on every call
+and never cached: its rows and version are not committed yet.
+"""
+import bisect
+import threading
+from collections import namedtuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Holiday
+from utils import get_data_version, bump_data_version
+
+HOLIDAY_VERSION_KEY = 'holidays'
+# Session.info flag set while the session holds uncommitted holiday changes
+_PENDING_KEY = 'holiday_index_pending'
+
+HolidayEntry = namedtuple('HolidayEntry', ['date', 'name', 'is_critical'])
+
+
+class HolidayIndex:
+    # version is None for an index built from uncommitted changes
+    def __init__(self, version, entries):
+        self.version = version
+        self.entries = sorted(entries, key=lambda e: e.date)
+        self.ordinals = [e.date.toordinal() for e in self.entries]
+
+    def first_blocked_day(self, start_date, end_date):
+        """Returns the first HolidayEntry falling within [start_date, end_date], or None."""
+        i = bisect.bisect_left(self.ordinals, start_date.toordinal())
+        if i < len(self.ordinals) and self.ordinals[i] <= end_date.toordinal():
+            return self.entries[i]
+        return None
+
+    def between(self, start_date, end_date):
+        """All entries within [start_date, end_date], in date order."""
+        lo = bisect.bisect_left(self.ordinals, start_date.toordinal())
+        hi = bisect.bisect_right(self.ordinals, end_date.toordinal())
+        return self.entries[lo:hi]
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def _load(version):
+    rows = db.session.query(Holiday.date, Holiday.name, Holiday.is_critical).all()
+    return HolidayIndex(version, [HolidayEntry(d, n, bool(c)) for d, n, c in rows])
+
+
+def get_holiday_index(version=None):
+    """
+    Returns the current index, reloading it if the holiday table changed since
+    it was built. Pass the 'holidays' version if it is already known to skip
+    looking it up.
+    """
+    global _index
+    if db.session.info.get(_PENDING_KEY):
+        return _load(None)
+    if version is None:
+        version = get_data_version(HOLIDAY_VERSION_KEY)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = _load(version)
+        return _index
+
+
+def invalidate_holiday_index():
+    """
+    Marks the holiday table as changed; call before committing any Holiday
+    write. Until that transaction ends, get_holiday_index() on this session
+    returns uncached indexes that include the staged changes.
+    """
+    bump_data_version(HOLIDAY_VERSION_KEY)
+    db.session.info[_PENDING_KEY] = True
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _end_pending(session, transaction):
+    # Committed, rolled back or closed: later calls go back to the shared index
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
@@ -4,9 +4,41 @@ This script automatically creates tables and seeds the admin user.
 Runs during the build process since shell access is not available on free tier.
 """
 import os
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
 from app import app
 from extensions import db
-from models import User, UserRole
+from models import User, UserRole, UserClosure, LeaveBalance
+import ledger
+import org_hierarchy
+
+def upgrade_schema():
+    """
+    Brings tables created by an older version up to date. create_all() only
+    creates missing tables, never missing columns or indexes on existing ones.
+    """
+    inspector = inspect(db.engine)
+    quote = db.engine.dialect.identifier_preparer.quote
+
+    leave_columns = {column['name'] for column in inspector.get_columns('leave')}
+    if 'updated_at' not in leave_columns:
+        print("🔄 Adding leave.updated_at...")
+        table = quote('leave')
+        with db.engine.begin() as conn:
+            # Added nullable and backfilled: SQLite cannot add a NOT NULL column without a constant default
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN updated_at TIMESTAMP"))
+            conn.execute(text(f"UPDATE {table} SET updated_at = COALESCE(approved_at, applied_at)"))
+            if db.engine.dialect.name != 'sqlite':
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN updated_at SET DEFAULT now()"))
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN updated_at SET NOT NULL"))
+        print("✅ leave.updated_at added and backfilled.")
+
+    # Indexes declared on the models (e.g. ix_leave_updated_at) that the existing tables lack
+    # (IF NOT EXISTS: expression indexes such as ix_user_lower_email cannot be reflected reliably)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
 
 def init_database():
     """Initialize database with tables and admin user"""
@@ -15,6 +47,7 @@ def init_database():
             # Create all tables
             print("🔄 Creating database tables...")
             db.create_all()
+            upgrade_schema()
             print("✅ Database tables created successfully!")
             
             # Check if admin already exists
@@ -31,6 +64,8 @@ def init_database():
                 admin.force_password_change = True
                 
                 db.session.add(admin)
+                db.session.flush()
+                org_hierarchy.insert_users([admin.id])
                 db.session.commit()
                 
                 print("=" * 60)
@@ -42,6 +77,21 @@ def init_database():
                 print("=" * 60)
             else:
                 print("ℹ️  Admin user already exists. Skipping creation.")
+
+            # The balance ledger is derived data: build it for databases that predate it and
+            # re-derive it when it is out of step (e.g. after the switch to working days)
+            if not LeaveBalance.query.first() or ledger.verify_ledger():
+                print("🔄 Rebuilding the leave balance ledger...")
+                rows = ledger.rebuild_ledger()
+                db.session.commit()
+                print(f"✅ Leave balance ledger rebuilt ({rows} rows).")
+
+            # Databases created before the org hierarchy table existed need it built once
+            if not UserClosure.query.first() and User.query.first():
+                print("🔄 Building the org hierarchy table...")
+                rows = org_hierarchy.rebuild_closure()
+                db.session.commit()
+                print(f"✅ Org hierarchy built ({rows} rows).")
                 
         except Exception as e:
             print(f"❌ Error initializing database: {e}")
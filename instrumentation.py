@@ -0,0 +1,212 @@
+"""
+Opt-in per-request performance instrumentation.
+
+When INSTRUMENTATION_ENABLED is set, every request records:
+- the number of SQL statements and the total time spent in the database,
+  plus the slowest statements;
+- time spent rendering templates;
+- time spent waiting on the LLM (code wraps those calls in track_llm()).
+
+The numbers are sent back as a Server-Timing header (visible in the browser's
+network panel), written as one JSON log line per request on the
+'instrumentation' logger, and aggregated per endpoint into histograms that
+are served in Prometheus text format at /metrics. For streamed responses
+(e.g. /employee/chat/stream) the log line and histograms are written when
+the stream closes, so they include the time spent producing the body.
+
+Histograms are kept per process; with several gunicorn workers each worker
+reports its own series (scrape each, or sum them).
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from flask import g, has_request_context, request, Response, abort, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('instrumentation')
+
+# Request duration buckets in milliseconds
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class RequestStats:
+    def __init__(self, slow_query_count):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.llm_ms = 0.0
+        self.slow_query_count = slow_query_count
+        self.slowest = []  # (duration_ms, statement), longest first
+
+    def add_query(self, statement, duration_ms):
+        self.query_count += 1
+        self.db_ms += duration_ms
+        if self.slow_query_count:
+            self.slowest.append((duration_ms, statement))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[self.slow_query_count:]
+
+
+class EndpointHistogram:
+    def __init__(self):
+        self.bucket_counts = [0] * (len(DURATION_BUCKETS_MS) + 1)  # last one is +Inf
+        self.count = 0
+        self.total_ms = 0.0
+        self.db_ms = 0.0
+        self.query_count = 0
+        self.llm_ms = 0.0
+
+    def observe(self, total_ms, stats):
+        self.bucket_counts[bisect.bisect_left(DURATION_BUCKETS_MS, total_ms)] += 1
+        self.count += 1
+        self.total_ms += total_ms
+        self.db_ms += stats.db_ms
+        self.query_count += stats.query_count
+        self.llm_ms += stats.llm_ms
+
+
+def _current_stats():
+    if has_request_context():
+        return g.get('_request_stats')
+    return None
+
+
+@contextmanager
+def track_llm():
+    """Adds the wrapped block's wall time to the current request's LLM time."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current_stats()
+        if stats is not None:
+            stats.llm_ms += (time.perf_counter() - started) * 1000
+
+
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('INSTRUMENTATION_ENABLED', False)
+        if not self.enabled:
+            return
+        self.slow_query_count = app.config.get('INSTRUMENTATION_SLOW_QUERIES', 3)
+        self.metrics_token = app.config.get('METRICS_TOKEN')
+
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    # --- SQLAlchemy hooks ---
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['_query_started'].pop()
+        stats = _current_stats()
+        if stats is not None:
+            stats.add_query(statement, (time.perf_counter() - started) * 1000)
+
+    # --- Template hooks ---
+    def _before_render(self, sender, template, context, **extra):
+        g._template_started = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        stats = _current_stats()
+        started = g.pop('_template_started', None)
+        if stats is not None and started is not None:
+            stats.template_ms += (time.perf_counter() - started) * 1000
+
+    # --- Request hooks ---
+    def _start_request(self):
+        g._request_stats = RequestStats(self.slow_query_count)
+
+    def _finish_request(self, response):
+        stats = g.pop('_request_stats', None)
+        if stats is None:
+            return response
+        endpoint, method, status = request.endpoint or 'unmatched', request.method, response.status_code
+        total_ms = (time.perf_counter() - stats.started) * 1000
+
+        # For streamed responses this only covers the work done before the first byte
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={stats.db_ms:.1f};desc="{stats.query_count} queries"',
+            f'tpl;dur={stats.template_ms:.1f}',
+            f'llm;dur={stats.llm_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+
+        if response.is_streamed:
+            # The body (and the LLM calls and queries made while producing it) runs after
+            # this hook, so log and aggregate once the stream is closed
+            response.call_on_close(lambda: self._record(endpoint, method, status, stats))
+        else:
+            self._record(endpoint, method, status, stats)
+        return response
+
+    def _record(self, endpoint, method, status, stats):
+        total_ms = (time.perf_counter() - stats.started) * 1000
+        logger.info(json.dumps({
+            'endpoint': endpoint,
+            'method': method,
+            'status': status,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(stats.db_ms, 2),
+            'query_count': stats.query_count,
+            'template_ms': round(stats.template_ms, 2),
+            'llm_ms': round(stats.llm_ms, 2),
+            'slowest_queries': [
+                {'ms': round(duration, 2), 'sql': ' '.join(statement.split())[:500]}
+                for duration, statement in stats.slowest
+            ],
+        }))
+
+        if endpoint != 'metrics':
+            with self._lock:
+                self._histograms.setdefault(endpoint, EndpointHistogram()).observe(total_ms, stats)
+
+    # --- /metrics ---
+    def metrics_view(self):
+        if self.metrics_token and request.headers.get('Authorization') != f'Bearer {self.metrics_token}':
+            abort(403)
+        return Response(self.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    def render_metrics(self):
+        lines = [
+            '# HELP leave_tracker_request_duration_ms Request duration per endpoint.',
+            '# TYPE leave_tracker_request_duration_ms histogram',
+        ]
+        with self._lock:
+            snapshot = sorted(self._histograms.items())
+            for endpoint, hist in snapshot:
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS_MS + ('+Inf',), hist.bucket_counts):
+                    cumulative += count
+                    lines.append(f'leave_tracker_request_duration_ms_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'leave_tracker_request_duration_ms_sum{{endpoint="{endpoint}"}} {hist.total_ms:.3f}')
+                lines.append(f'leave_tracker_request_duration_ms_count{{endpoint="{endpoint}"}} {hist.count}')
+
+            for name, attr, help_text in (
+                ('leave_tracker_db_time_ms_total', 'db_ms', 'Total time spent in SQL per endpoint.'),
+                ('leave_tracker_queries_total', 'query_count', 'SQL statements executed per endpoint.'),
+                ('leave_tracker_llm_time_ms_total', 'llm_ms', 'Total time spent waiting on the LLM per endpoint.'),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for endpoint, hist in snapshot:
+                    value = getattr(hist, attr)
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {value:.3f}' if isinstance(value, float)
+                                 else f'{name}{{endpoint="{endpoint}"}} {value}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,75 @@
+"""
+Working-day durations for leaves.
+
+A leave's length is the number of working days it covers: weekends and
+company holidays inside the range are not counted, while critical days are
+ordinary working days. Counting goes through NumPy's business-day
+functions, so a whole batch of leaves is counted with one
+np.busday_count() call over arrays of start and end dates.
+
+The business-day calendar is built from the holiday index and rebuilt only
+when the holiday version changes. Every view (dashboards, ledger, report,
+CSV export, detail modal) counts days through this module so they agree.
+"""
+import datetime
+import threading
+import numpy as np
+from holiday_index import get_holiday_index
+
+WEEKMASK = '1111100'  # Monday to Friday are working days
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+_calendar = None  # (holiday version, numpy busdaycalendar, critical dates)
+_lock = threading.Lock()
+
+
+def business_calendar():
+    """Returns (busdaycalendar, critical day dates) for the current holiday version."""
+    global _calendar
+    index = get_holiday_index()
+    if index.version is None:
+        return _build_calendar(index)[1:]  # Uncommitted holiday changes: not cached
+    cached = _calendar
+    if cached is not None and cached[0] == index.version:
+        return cached[1], cached[2]
+    with _lock:
+        if _calendar is None or _calendar[0] != index.version:
+            _calendar = _build_calendar(index)
+        return _calendar[1], _calendar[2]
+
+
+def _build_calendar(index):
+    holidays = np.array([e.date for e in index.entries if not e.is_critical], dtype='datetime64[D]')
+    critical = np.array([e.date for e in index.entries if e.is_critical], dtype='datetime64[D]')
+    return index.version, np.busdaycalendar(weekmask=WEEKMASK, holidays=holidays), critical
+
+
+def to_datetime64(dates):
+    """datetime64[D] array from a sequence of dates (via ordinals, much faster than np.array on date objects)."""
+    if isinstance(dates, np.ndarray):
+        return dates.astype('datetime64[D]')
+    ordinals = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(dates))
+    return (ordinals - _EPOCH_ORDINAL).astype('datetime64[D]')
+
+
+def working_days_bulk(start_dates, end_dates):
+    """Working days in each inclusive [start, end] range, as an int64 array."""
+    if len(start_dates) == 0:
+        return np.zeros(0, dtype=np.int64)
+    busdaycal, _ = business_calendar()
+    starts = to_datetime64(start_dates)
+    ends = to_datetime64(end_dates) + 1  # busday_count's end is exclusive
+    return np.busday_count(starts, ends, busdaycal=busdaycal).astype(np.int64)
+
+
+def working_days(start_date, end_date):
+    """Working days in the inclusive range [start_date, end_date]."""
+    return int(working_days_bulk([start_date], [end_date])[0])
+
+
+def total_working_days(rows):
+    """Sum of working days over (start_date, end_date) pairs."""
+    if not rows:
+        return 0
+    starts, ends = zip(*rows)
+    return int(working_days_bulk(starts, ends).sum())
@@ -0,0 +1,106 @@
+"""
+Long-weekend planner.
+
+Finds where to place `num_days` of leave to get the longest runs of
+consecutive days off. It works on a NumPy business-day calendar: weekends
+and company holidays are days off, and critical days are working days on
+which leave is not allowed. The calendar is rebuilt only when the holiday
+version changes (see leave_duration.py).
+
+Leave is placed on consecutive working days. The run of days off it creates
+reaches from the working day before the first leave day to the working day
+after the last one. With the working days in an array, every possible
+placement across the year is scored in a handful of vectorized operations.
+A placement whose dates span a holiday is not suggested, because
+apply_leave refuses any range containing a holiday or critical day.
+"""
+import datetime
+import numpy as np
+from holiday_index import get_holiday_index
+from leave_duration import business_calendar
+
+HORIZON_DAYS = 365
+MAX_LEAVE_DAYS = 15
+# Days looked at past the horizon so runs starting near its end are measured in full
+LOOKAHEAD_DAYS = 60
+
+
+def plan_leave(num_days, limit=5, start_date=None, horizon_days=HORIZON_DAYS):
+    """
+    Returns up to `limit` placements of `num_days` leave days, starting within
+    `horizon_days` of `start_date` (default: tomorrow). They are ranked by
+    consecutive days off (earlier first on ties) and never overlap each other.
+    Their leave ranges contain no holiday or critical day, so each one can be
+    filed as it is.
+    """
+    if not 1 <= num_days <= MAX_LEAVE_DAYS:
+        raise ValueError(f"num_days must be between 1 and {MAX_LEAVE_DAYS}")
+
+    index = get_holiday_index()
+    busdaycal, critical = business_calendar()
+    start_date = start_date or datetime.date.today() + datetime.timedelta(days=1)
+
+    dates = np.arange(np.datetime64(start_date, 'D'), np.datetime64(start_date, 'D') + horizon_days + LOOKAHEAD_DAYS)
+    workdays = np.flatnonzero(np.is_busday(dates, busdaycal=busdaycal))  # day offsets of working days
+    if len(workdays) < num_days:
+        return []
+    blocked = np.isin(dates[workdays], critical)
+
+    # Placement j takes leave on workdays[j .. j+num_days-1]; it is valid if none of them is a critical day
+    blocked_so_far = np.concatenate(([0], np.cumsum(blocked)))
+    valid = (blocked_so_far[num_days:] - blocked_so_far[:-num_days]) == 0
+    first_leave = workdays[:len(valid)]
+    last_leave = workdays[num_days - 1:]
+    valid &= first_leave < horizon_days
+
+    # The surrounding working days bound the run of days off (-1 / len(dates) at the edges)
+    bounds = np.concatenate(([-1], workdays, [len(dates)]))
+    off_start = bounds[:len(valid)] + 1
+    off_end = bounds[num_days + 1:] - 1
+    days_off = off_end - off_start + 1
+
+    candidates = np.flatnonzero(valid)
+    order = candidates[np.lexsort((first_leave[candidates], -days_off[candidates]))]
+
+    suggestions = []
+    taken = []
+    for j in order:
+        if len(suggestions) >= limit:
+            break
+        if any(off_start[j] <= end and start <= off_end[j] for start, end in taken):
+            continue  # Overlaps a better run already suggested
+        if index.first_blocked_day(_day(start_date, first_leave[j]), _day(start_date, last_leave[j])):
+            continue  # Spans a holiday, so the leave request would be refused
+        taken.append((off_start[j], off_end[j]))
+        suggestions.append(_suggestion(index, start_date, num_days, first_leave[j], last_leave[j],
+                                       off_start[j], off_end[j]))
+    return suggestions
+
+
+def _day(start_date, offset):
+    return start_date + datetime.timedelta(days=int(offset))
+
+
+def _suggestion(index, start_date, num_days, first_leave, last_leave, off_start, off_end):
+    def day(offset):
+        return _day(start_date, offset)
+
+    days_off = int(off_end - off_start + 1)
+    holidays = [h.name for h in index.between(day(off_start), day(off_end)) if not h.is_critical]
+    if num_days == 1:
+        when = f"1 day of leave on {day(first_leave).strftime('%a %b %d')}"
+    else:
+        when = (f"{num_days} days of leave from {day(first_leave).strftime('%a %b %d')} "
+                f"to {day(last_leave).strftime('%a %b %d')}")
+    return {
+        "leave_start": day(first_leave).isoformat(),
+        "leave_end": day(last_leave).isoformat(),
+        "leave_days": num_days,
+        "off_start": day(off_start).isoformat(),
+        "off_end": day(off_end).isoformat(),
+        "days_off": days_off,
+        "holidays": holidays,
+        "reason": (f"File {when} for {days_off} consecutive days off "
+                   f"({day(off_start).strftime('%a %b %d')} - {day(off_end).strftime('%a %b %d')})"
+                   + (f", including {', '.join(holidays)}." if holidays else ".")),
+    }
@@ -0,0 +1,229 @@
+"""
+Leave balance ledger.
+
+LeaveBalance holds one row per (user, year, leave type, status) with the number
+of leave days in that bucket, so balance reads are primary-key lookups instead
+of scans over a user's whole leave history. Leaves are bucketed by the year of
+their start date, the same rule the dashboard summaries use. Days are working
+days (leave_duration.py), so holiday changes re-derive the buckets of the
+leaves they overlap (refresh_for_holiday_dates).
+
+The helpers below only stage changes on db.session; callers commit them in the
+same transaction as the Leave change they describe.
+"""
+import datetime
+import numpy as np
+from sqlalchemy import func, insert, or_, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Leave, LeaveBalance, LeaveStatus, LeaveType
+from leave_duration import to_datetime64, working_days, working_days_bulk
+
+_TYPES = list(LeaveType)
+_STATUSES = list(LeaveStatus)
+# INSERT ... ON CONFLICT DO UPDATE where the dialect has it; others update, then insert in a SAVEPOINT
+_UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def leave_day_count(leave):
+    """Number of working days a leave contributes to the ledger."""
+    return working_days(leave.start_date, leave.end_date)
+
+
+def _as_type(leave_type):
+    # Leaves created with the enum *name* (e.g. the chatbot tools) are not coerced until flush
+    return LeaveType[leave_type] if isinstance(leave_type, str) else leave_type
+
+
+def _as_status(status):
+    if status is None:
+        return LeaveStatus.PENDING  # column default, not applied until flush
+    return LeaveStatus[status] if isinstance(status, str) else status
+
+
+def _add_days(user_id, year, leave_type, status, days):
+    if not days:
+        return
+    # Concurrent requests may create the same bucket: an upsert makes both of them add to it
+    key = dict(user_id=user_id, year=year, leave_type=leave_type, status=status)
+    upsert_insert = _UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if upsert_insert is not None:
+        stmt = upsert_insert(LeaveBalance).values(days=days, **key)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[LeaveBalance.user_id, LeaveBalance.year, LeaveBalance.leave_type, LeaveBalance.status],
+            set_={'days': LeaveBalance.days + stmt.excluded.days},
+        ))
+        return
+    if _increment_days(key, days):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(LeaveBalance).values(days=days, **key))
+    except IntegrityError:
+        _increment_days(key, days)  # Another transaction created the bucket first
+
+
+def _increment_days(key, days):
+    result = db.session.execute(
+        update(LeaveBalance)
+        .where(*(getattr(LeaveBalance, column) == value for column, value in key.items()))
+        .values(days=LeaveBalance.days + days)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+def record_leave_applied(leave):
+    """Adds a newly created leave to its user's balance."""
+    _add_days(leave.user_id, leave.start_date.year, _as_type(leave.leave_type),
+              _as_status(leave.status), leave_day_count(leave))
+
+
+def record_status_change(leave, old_status):
+    """Moves a leave's days from old_status to its current status."""
+    old_status, new_status = _as_status(old_status), _as_status(leave.status)
+    if old_status == new_status:
+        return
+    days = leave_day_count(leave)
+    leave_type = _as_type(leave.leave_type)
+    _add_days(leave.user_id, leave.start_date.year, leave_type, old_status, -days)
+    _add_days(leave.user_id, leave.start_date.year, leave_type, new_status, days)
+
+
+def record_bulk_status_change(leaves, old_status, new_status):
+    """
+    Moves many leaves' days from old_status to new_status. `leaves` are rows
+    with user_id, leave_type, start_date and end_date. Days are counted in one
+    call and applied once per (user, year, type) bucket.
+    """
+    old_status, new_status = _as_status(old_status), _as_status(new_status)
+    if old_status == new_status or not leaves:
+        return
+    days = working_days_bulk([l.start_date for l in leaves], [l.end_date for l in leaves])
+    buckets = {}
+    for leave, count in zip(leaves, days.tolist()):
+        key = (leave.user_id, leave.start_date.year, _as_type(leave.leave_type))
+        buckets[key] = buckets.get(key, 0) + count
+    for (user_id, year, leave_type), count in buckets.items():
+        _add_days(user_id, year, leave_type, old_status, -count)
+        _add_days(user_id, year, leave_type, new_status, count)
+
+
+def remove_user(user_id):
+    """Drops all balance rows of a user whose leaves are being deleted."""
+    LeaveBalance.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+
+
+def get_year_balances(user_id, year):
+    """Returns {(LeaveType, LeaveStatus): days} for one user and year."""
+    rows = db.session.query(LeaveBalance.leave_type, LeaveBalance.status, LeaveBalance.days).filter(
+        LeaveBalance.user_id == user_id,
+        LeaveBalance.year == year,
+    ).all()
+    return {(leave_type, status): days for leave_type, status, days in rows}
+
+
+def _year_range(year):
+    return Leave.start_date >= datetime.date(year, 1, 1), Leave.start_date < datetime.date(year + 1, 1, 1)
+
+
+def _leave_years():
+    rows = db.session.query(func.extract('year', Leave.start_date)).distinct().all()
+    return sorted(int(y) for (y,) in rows if y is not None)
+
+
+def _derived_balances(*conditions):
+    """
+    Recomputes the buckets of the leaves matching conditions from the Leave
+    table: {(user_id, year, type, status): days}. Working days are counted for
+    all rows with one busday_count call and summed per bucket with bincount.
+    """
+    rows = db.session.query(
+        Leave.user_id, Leave.start_date, Leave.end_date, Leave.leave_type, Leave.status
+    ).filter(*conditions).all()
+    if not rows:
+        return {}
+    user_ids, start_dates, end_dates, leave_types, statuses = zip(*rows)
+    starts = to_datetime64(start_dates)
+    days = working_days_bulk(starts, end_dates)
+
+    type_codes = {t: i for i, t in enumerate(_TYPES)}
+    status_codes = {st: i for i, st in enumerate(_STATUSES)}
+    keys = np.column_stack([
+        np.array(user_ids, dtype=np.int64),
+        starts.astype('datetime64[Y]').astype(np.int64) + 1970,
+        np.array([type_codes[t] for t in leave_types], dtype=np.int64),
+        np.array([status_codes[st] for st in statuses], dtype=np.int64),
+    ])
+    buckets, bucket_of_row = np.unique(keys, axis=0, return_inverse=True)
+    totals = np.bincount(bucket_of_row.ravel(), weights=days, minlength=len(buckets)).astype(np.int64)
+    return {
+        (int(user_id), int(year), _TYPES[t], _STATUSES[st]): int(total)
+        for (user_id, year, t, st), total in zip(buckets, totals) if total
+    }
+
+
+def _all_derived_balances():
+    # One year at a time keeps memory bounded on large Leave tables
+    balances = {}
+    for year in _leave_years():
+        balances.update(_derived_balances(*_year_range(year)))
+    return balances
+
+
+def verify_ledger():
+    """Returns a list of (bucket, ledger_days, actual_days) for every bucket that disagrees."""
+    expected = _all_derived_balances()
+    actual = {
+        (b.user_id, b.year, b.leave_type, b.status): b.days
+        for b in LeaveBalance.query.all() if b.days
+    }
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=lambda k: (k[0], k[1], k[2].name, k[3].name)):
+        if expected.get(key, 0) != actual.get(key, 0):
+            mismatches.append((key, actual.get(key, 0), expected.get(key, 0)))
+    return mismatches
+
+
+def rebuild_ledger():
+    """Replaces the whole ledger with totals recomputed from Leave. Returns the number of rows written."""
+    LeaveBalance.query.delete(synchronize_session=False)
+    balances = _all_derived_balances()
+    _insert_balances(balances)
+    return len(balances)
+
+
+def _insert_balances(balances):
+    db.session.bulk_insert_mappings(LeaveBalance, [
+        {'user_id': user_id, 'year': year, 'leave_type': leave_type, 'status': status, 'days': days}
+        for (user_id, year, leave_type, status), days in balances.items()
+    ])
+
+
+def refresh_for_holiday_dates(dates):
+    """
+    Re-derives the buckets of every (user, year) with a leave covering one of
+    the given dates, after holidays on those dates were added, removed or
+    changed. Call it after the holiday change is staged (and the holiday index
+    invalidated) and commit both together. Returns the (user_id, year) pairs refreshed.
+    """
+    dates = [d for d in dates if d is not None]
+    if not dates:
+        return []
+    affected = db.session.query(Leave.user_id, func.extract('year', Leave.start_date)).filter(
+        or_(*[(Leave.start_date <= d) & (Leave.end_date >= d) for d in dates])
+    ).distinct().all()
+    affected = sorted({(user_id, int(year)) for user_id, year in affected})
+    if not affected:
+        return []
+
+    LeaveBalance.query.filter(
+        tuple_(LeaveBalance.user_id, LeaveBalance.year).in_(affected)
+    ).delete(synchronize_session=False)
+    balances = {}
+    for year in sorted({year for _, year in affected}):
+        user_ids = [user_id for user_id, y in affected if y == year]
+        balances.update(_derived_balances(Leave.user_id.in_(user_ids), *_year_range(year)))
+    _insert_balances(balances)
+    return affected
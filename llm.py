@@ -0,0 +1,65 @@
+"""
+Shared LLM client for the Leavy chatbot.
+
+LLM_BACKEND picks the implementation:
+
+- 'azure' (default): one AzureOpenAI client per process, created on first use
+  (after gunicorn forks) on top of a pooled httpx client. Connections are kept
+  alive between chat messages instead of paying DNS, TCP and TLS setup on
+  every request.
+- 'fake': the deterministic in-process stand-in from llm_fake.py, for load
+  tests and benchmarks without a live service.
+
+Both expose the openai SDK's `client.chat.completions.create(...)`, which is
+the interface the chat routes program against.
+"""
+import os
+import threading
+import httpx
+from flask import current_app
+from openai import AzureOpenAI
+
+_client = None
+_lock = threading.Lock()
+
+
+def _create_azure_client(config):
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=config['LLM_MAX_CONNECTIONS'],
+            max_keepalive_connections=config['LLM_MAX_CONNECTIONS'],
+            keepalive_expiry=config['LLM_KEEPALIVE_SECONDS'],
+        ),
+        timeout=httpx.Timeout(config['LLM_TIMEOUT_SECONDS'], connect=10.0),
+    )
+    return AzureOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+        http_client=http_client,
+        max_retries=config['LLM_MAX_RETRIES'],
+    )
+
+
+def get_llm_client():
+    """Returns the process-wide client for the configured LLM_BACKEND, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                config = current_app.config
+                backend = config['LLM_BACKEND']
+                if backend == 'azure':
+                    _client = _create_azure_client(config)
+                elif backend == 'fake':
+                    from llm_fake import FakeLLMClient
+                    _client = FakeLLMClient.from_config(config)
+                else:
+                    raise ValueError(f"Unknown LLM_BACKEND '{backend}' (expected 'azure' or 'fake')")
+    return _client
+
+
+def get_llm_deployment():
+    if current_app.config['LLM_BACKEND'] == 'fake':
+        return 'fake'
+    return os.getenv("AZURE_OPENAI_DEPLOYMENT")
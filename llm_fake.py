@@ -0,0 +1,140 @@
+"""
+Deterministic in-process stand-in for the Azure OpenAI chat API.
+
+Selected with LLM_BACKEND=fake. It answers `client.chat.completions.create`
+with the same response types as the openai SDK (plain and streamed), so
+the chat routes, tools, chat pool and history run exactly as in production
+while no request leaves the process. Useful for load tests and benchmarks.
+
+Replies follow a script: a list of rules matched in order against the
+latest user message (case-insensitive regex; "" matches anything):
+
+    [
+      {"match": "sick", "tool_calls": [{"name": "file_sick_leave", "arguments": {"reason": "Flu"}}],
+       "reply": "Done, get well soon!"},
+      {"match": "", "reply": "Hello from the fake LLM."}
+    ]
+
+If the matched rule has tool_calls, the first completion returns them and the
+completion after the tool results returns "reply" (with "{tool_output}"
+replaced by the first tool result). Argument strings of the form "$date+N"
+become the ISO date N days from today. LLM_FAKE_SCRIPT points at a JSON file
+with a custom script; DEFAULT_SCRIPT is used otherwise.
+
+Latency is simulated with LLM_FAKE_LATENCY_MS before each completion and
+LLM_FAKE_CHUNK_MS between streamed chunks.
+"""
+import datetime
+import json
+import re
+import time
+from types import SimpleNamespace
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+DEFAULT_SCRIPT = [
+    {"match": r"sick|unwell|fever",
+     "tool_calls": [{"name": "file_sick_leave", "arguments": {"reason": "Not feeling well"}}],
+     "reply": "I've filed your sick leave for today. Get well soon! {tool_output}"},
+    {"match": r"\b(file|book)\b",
+     "tool_calls": [{"name": "file_leave", "arguments": {"start_date": "$date+30", "end_date": "$date+31"}}],
+     "reply": "All set! {tool_output}"},
+    {"match": r"vacation|long weekend|leave|day off",
+     "tool_calls": [{"name": "suggest_leave_dates", "arguments": {"num_days": 2}}],
+     "reply": "Here are some good dates for a break: {tool_output} Shall I file one of them for you?"},
+    {"match": "",
+     "reply": "Hi! I'm Leavy. I can suggest good days to take leave or file a leave for you."},
+]
+
+_DATE_ARG = re.compile(r'^\$date\+(\d+)$')
+
+
+def _expand_arguments(arguments):
+    expanded = {}
+    for name, value in arguments.items():
+        match = _DATE_ARG.match(value) if isinstance(value, str) else None
+        if match:
+            value = (datetime.date.today() + datetime.timedelta(days=int(match.group(1)))).isoformat()
+        expanded[name] = value
+    return expanded
+
+
+def _text_of(message):
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+class FakeCompletions:
+    def __init__(self, script, latency_ms, chunk_ms):
+        self.script = script
+        self.latency = latency_ms / 1000
+        self.chunk_delay = chunk_ms / 1000
+
+    def _rule_for(self, messages):
+        user_text = next((_text_of(m) for m in reversed(messages) if m["role"] == "user"), "")
+        for rule in self.script:
+            if re.search(rule.get("match", ""), user_text, re.IGNORECASE):
+                return rule
+        return {"reply": ""}
+
+    def _plan(self, messages, tools):
+        """Returns (content, tool_calls) for the next assistant message."""
+        rule = self._rule_for(messages)
+        last = messages[-1]
+        if last["role"] == "tool":
+            tool_output = last.get("content") or ""
+            return rule.get("reply", "").replace("{tool_output}", tool_output), []
+        if tools and rule.get("tool_calls"):
+            # Ids only depend on the conversation length, so runs are repeatable
+            tool_calls = [{
+                "id": f"call_{len(messages)}_{i}",
+                "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(_expand_arguments(call.get("arguments", {})))},
+            } for i, call in enumerate(rule["tool_calls"])]
+            return None, tool_calls
+        return rule.get("reply", "").replace("{tool_output}", ""), []
+
+    def create(self, model, messages, stream=False, tools=None, **kwargs):
+        content, tool_calls = self._plan(messages, tools)
+        time.sleep(self.latency)
+        finish_reason = "tool_calls" if tool_calls else "stop"
+        if not stream:
+            return ChatCompletion.model_validate({
+                "id": "fake-completion", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": finish_reason, "message": {
+                    "role": "assistant", "content": content, "tool_calls": tool_calls or None,
+                }}],
+            })
+        return self._stream(model, content, tool_calls, finish_reason)
+
+    def _stream(self, model, content, tool_calls, finish_reason):
+        def chunk(delta, finish=None):
+            return ChatCompletionChunk.model_validate({
+                "id": "fake-completion", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": finish, "delta": delta}],
+            })
+
+        for i, call in enumerate(tool_calls):
+            yield chunk({"tool_calls": [{"index": i, "id": call["id"], "type": "function",
+                                         "function": {"name": call["function"]["name"], "arguments": ""}}]})
+            yield chunk({"tool_calls": [{"index": i, "function": {"arguments": call["function"]["arguments"]}}]})
+        for word in re.findall(r'\S+\s*', content or ""):
+            time.sleep(self.chunk_delay)
+            yield chunk({"content": word})
+        yield chunk({}, finish_reason)
+
+
+class FakeLLMClient:
+    """Mimics the parts of openai.AzureOpenAI used by the chatbot."""
+
+    def __init__(self, script=None, latency_ms=0, chunk_ms=0):
+        self.chat = SimpleNamespace(completions=FakeCompletions(script or DEFAULT_SCRIPT, latency_ms, chunk_ms))
+
+    @classmethod
+    def from_config(cls, config):
+        script = None
+        if config.get('LLM_FAKE_SCRIPT'):
+            with open(config['LLM_FAKE_SCRIPT']) as fh:
+                script = json.load(fh)
+        return cls(script, config['LLM_FAKE_LATENCY_MS'], config['LLM_FAKE_CHUNK_MS'])
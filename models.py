@@ -52,7 +52,21 @@ class User(db.Model, UserMixin):
     def __repr__(self):
         return f"<User {self.email} ({self.role.value})>"
 
+# Indexes behind the admin user directory: case-insensitive prefix search and filters.
+# text_pattern_ops lets PostgreSQL use the index for LIKE 'prefix%' under any collation.
+db.Index('ix_user_lower_name', db.func.lower(User.name).label('lower_name'),
+         postgresql_ops={'lower_name': 'text_pattern_ops'})
+db.Index('ix_user_lower_email', db.func.lower(User.email).label('lower_email'),
+         postgresql_ops={'lower_email': 'text_pattern_ops'})
+db.Index('ix_user_manager_id', User.manager_id)
+db.Index('ix_user_role_name', User.role, User.name)
+
 class Leave(db.Model):
+    __table_args__ = (
+        # Dashboard summaries filter a single user's leaves by start date
+        db.Index('ix_leave_user_id_start_date', 'user_id', 'start_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     leave_type = db.Column(db.Enum(LeaveType), nullable=False)
@@ -65,10 +79,23 @@ class Leave(db.Model):
     approved_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     approved_at = db.Column(db.DateTime, nullable=True)
     rejection_reason = db.Column(db.Text, nullable=True)
+    # Bumped on every change; the calendar feeds use it for delta sync and ETags
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                           server_default=db.func.now(), index=True)
 
     def __repr__(self):
         return f"<Leave {self.id} for {self.employee.name} ({self.start_date} to {self.end_date}) - {self.status.value}>"
 
+class LeaveTombstone(db.Model):
+    """Records deleted leaves so delta calendar clients can drop them."""
+    id = db.Column(db.Integer, primary_key=True)
+    leave_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<LeaveTombstone leave={self.leave_id} at {self.deleted_at}>"
+
 class Holiday(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, unique=True, nullable=False)
@@ -76,4 +103,46 @@ class Holiday(db.Model):
     is_critical = db.Column(db.Boolean, default=False)
 
     def __repr__(self):
-        return f"<Holiday {self.name} on {self.date}>"
\ No newline at end of file
+        return f"<Holiday {self.name} on {self.date}>"
+
+class LeaveBalance(db.Model):
+    """Materialized day totals per user, year, leave type and status. Maintained by ledger.py."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    leave_type = db.Column(db.Enum(LeaveType), primary_key=True)
+    status = db.Column(db.Enum(LeaveStatus), primary_key=True)
+    days = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<LeaveBalance user={self.user_id} {self.year} {self.leave_type.value}/{self.status.value}: {self.days}>"
+
+class DataVersion(db.Model):
+    """Monotonic version counters for cached data (e.g. 'holidays'), bumped in the same transaction as the change."""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DataVersion {self.name}={self.version}>"
+
+class UserClosure(db.Model):
+    """
+    Every (ancestor, descendant) pair of the manager tree, including each
+    user's depth-0 pair with themselves. Maintained by org_hierarchy.py.
+    """
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, index=True)
+    depth = db.Column(db.Integer, nullable=False) # 1 = direct report, 2 = their reports, ...
+
+    def __repr__(self):
+        return f"<UserClosure {self.ancestor_id} -> {self.descendant_id} ({self.depth})>"
+
+class ChatConversation(db.Model):
+    """A Leavy chat conversation. Only its id is kept in the session; see chat_history.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    messages = db.Column(db.JSON, nullable=False, default=list) # Turns without the system prompt
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<ChatConversation {self.id} user={self.user_id} turns={len(self.messages or [])}>"
@@ -0,0 +1,137 @@
+"""
+Closure table of the manager tree (UserClosure).
+
+User.manager_id only links a user to their direct manager. The closure table
+stores every (ancestor, descendant, depth) pair, so "everyone below X" is a
+single indexed lookup on ancestor_id instead of a walk down the tree:
+
+    Leave.user_id.in_(managed_employee_ids_subquery(x, subtree=True))
+
+Every change to User.manager_id must go through this module in the same
+transaction: insert_users() for new users, move_user() when a manager
+changes and remove_user() before a user is deleted. Bulk loaders that bypass
+it (e.g. the synthetic seeder) call rebuild_closure() afterwards.
+`flask org-closure-rebuild --check` verifies the table against manager_id.
+"""
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import aliased
+from extensions import db
+from models import User, UserClosure
+
+# Stops the rebuild's recursion on corrupt data (a manager_id cycle)
+MAX_TREE_DEPTH = 100
+
+
+def subtree_ids_subquery(user_id, include_self=False):
+    """SELECT of the ids of everyone below user_id (and user_id itself if include_self)."""
+    return select(UserClosure.descendant_id).where(
+        UserClosure.ancestor_id == user_id,
+        UserClosure.depth >= (0 if include_self else 1),
+    )
+
+
+def ancestor_ids(user_ids):
+    """Ids of every user above any of user_ids, and of user_ids themselves."""
+    if not user_ids:
+        return set()
+    return set(db.session.scalars(
+        select(UserClosure.ancestor_id).where(UserClosure.descendant_id.in_(user_ids)).distinct()
+    ))
+
+
+def has_subtree(user_id):
+    """Whether anyone reports to user_id's direct reports (i.e. the subtree is deeper than the team)."""
+    return db.session.query(
+        select(UserClosure.descendant_id).where(UserClosure.ancestor_id == user_id, UserClosure.depth >= 2).exists()
+    ).scalar()
+
+
+def insert_users(user_ids):
+    """
+    Adds closure rows for new users (a list or SELECT of ids). Their managers
+    must already be in the table, so insert managers before their reports.
+    """
+    db.session.execute(insert(UserClosure).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(User.id, User.id, literal(0)).where(User.id.in_(user_ids)),
+    ))
+    db.session.execute(insert(UserClosure).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(UserClosure.ancestor_id, User.id, UserClosure.depth + 1).join(
+            User, User.manager_id == UserClosure.descendant_id
+        ).where(User.id.in_(user_ids)),
+    ))
+
+
+def would_create_cycle(user_id, manager_id):
+    """True if making manager_id the manager of user_id would put user_id below itself."""
+    return manager_id is not None and db.session.query(
+        subtree_ids_subquery(user_id, include_self=True).where(UserClosure.descendant_id == manager_id).exists()
+    ).scalar()
+
+
+def move_user(user_id, new_manager_id):
+    """
+    Re-attaches user_id and everyone below them under new_manager_id (None
+    makes them a root). Raises ValueError if that would create a cycle.
+    """
+    if would_create_cycle(user_id, new_manager_id):
+        raise ValueError("A user cannot report to themselves or to someone who reports to them.")
+    # Detach the subtree from its current ancestors
+    db.session.execute(delete(UserClosure).where(
+        UserClosure.descendant_id.in_(subtree_ids_subquery(user_id, include_self=True)),
+        UserClosure.ancestor_id.in_(select(UserClosure.ancestor_id).where(
+            UserClosure.descendant_id == user_id, UserClosure.depth >= 1
+        )),
+    ).execution_options(synchronize_session=False))
+    if new_manager_id is None:
+        return
+    # Every ancestor of the new manager (and the manager) x every member of the subtree
+    above, below = aliased(UserClosure), aliased(UserClosure)
+    db.session.execute(insert(UserClosure).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1).select_from(above).join(
+            below, below.ancestor_id == user_id
+        ).where(above.descendant_id == new_manager_id),
+    ))
+
+
+def remove_user(user_id):
+    """
+    Drops user_id from the tree before the user is deleted. Their direct
+    reports become roots of their own subtrees (the caller clears their
+    manager_id), keeping the pairs inside those subtrees.
+    """
+    db.session.execute(delete(UserClosure).where(
+        UserClosure.descendant_id.in_(subtree_ids_subquery(user_id, include_self=True)),
+        UserClosure.ancestor_id.in_(select(UserClosure.ancestor_id).where(UserClosure.descendant_id == user_id)),
+    ).execution_options(synchronize_session=False))
+
+
+def _derived_closure():
+    """Recursive CTE producing the closure rows from User.manager_id."""
+    tree = select(User.id.label('ancestor_id'), User.id.label('descendant_id'), literal(0).label('depth')).cte(
+        'tree', recursive=True
+    )
+    tree = tree.union_all(
+        select(tree.c.ancestor_id, User.id, tree.c.depth + 1).join(
+            User, User.manager_id == tree.c.descendant_id
+        ).where(tree.c.depth < MAX_TREE_DEPTH)
+    )
+    return select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth)
+
+
+def rebuild_closure():
+    """Replaces the whole table with pairs recomputed from User.manager_id. Returns the number of rows written."""
+    db.session.execute(delete(UserClosure))
+    db.session.execute(insert(UserClosure).from_select(['ancestor_id', 'descendant_id', 'depth'], _derived_closure()))
+    return db.session.query(func.count()).select_from(UserClosure).scalar()
+
+
+def verify_closure():
+    """Returns (ancestor, descendant, depth) rows that are missing from or extra in the table."""
+    expected = set(db.session.execute(_derived_closure()).all())
+    actual = set(db.session.execute(
+        select(UserClosure.ancestor_id, UserClosure.descendant_id, UserClosure.depth)
+    ).all())
+    return sorted(expected ^ actual)
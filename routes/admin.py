@@ -1,9 +1,20 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
-from forms import UserForm, HolidayForm
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from forms import UserForm, HolidayForm, HolidayImportForm, HolidayImportConfirmForm, UserImportForm, UserImportConfirmForm
 from models import User, UserRole, Holiday
 from extensions import db
-from utils import admin_required
-from flask_login import login_required
+import ledger
+import org_hierarchy
+from holiday_index import invalidate_holiday_index, HolidayEntry
+from holiday_import import HolidayImportError, apply_import, diff_holidays, parse_holiday_file
+from user_import import UserImportError, parse_user_file, plan_import, provision_users, stage_import, take_staged_import
+from utils import admin_required, invalidate_team_summary, bump_data_version, managed_employee_ids_subquery
+from absence_heatmap import absence_heatmap, parse_heatmap_args
+from calendar_feed import USERS_VERSION_KEY
+from flask_login import login_required, current_user
+from sqlalchemy import and_, insert, literal, or_, select
+from sqlalchemy.orm import joinedload
+import datetime
+import json
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -18,8 +29,55 @@ def dashboard():
 @login_required
 @admin_required
 def manage_users():
-    users = User.query.all()
-    return render_template('admin/manage_users.html', users=users, title='Manage Users')
+    """
+    Paginated user directory.
+    Query parameters:
+    - q: case-insensitive prefix of the name or email
+    - role: 'ADMIN', 'MANAGER' or 'EMPLOYEE'
+    - manager_id: id of the manager, or 'none' for users without one
+    - page / per_page
+    """
+    search = request.args.get('q', '').strip()
+    role_filter = request.args.get('role', '')
+    manager_filter = request.args.get('manager_id', '')
+    page = request.args.get('page', 1, type=int)
+    per_page = min(max(request.args.get('per_page', USERS_PAGE_SIZE, type=int), 1), 200)
+
+    query = User.query.options(joinedload(User.manager))
+    if search:
+        query = query.filter(or_(_prefix_match(User.name, search), _prefix_match(User.email, search)))
+    if role_filter in UserRole.__members__:
+        query = query.filter(User.role == UserRole[role_filter])
+    if manager_filter == 'none':
+        query = query.filter(User.manager_id.is_(None))
+    elif manager_filter.isdigit():
+        query = query.filter(User.manager_id == int(manager_filter))
+
+    pagination = query.order_by(User.name, User.id).paginate(page=page, per_page=per_page, error_out=False)
+    managers = db.session.query(User.id, User.name).filter(User.role == UserRole.MANAGER).order_by(User.name).all()
+
+    return render_template('admin/manage_users.html',
+                           users=pagination.items,
+                           pagination=pagination,
+                           managers=managers,
+                           search=search,
+                           role_filter=role_filter,
+                           manager_filter=manager_filter,
+                           # Only carried through the links when chosen, so default URLs stay short
+                           per_page=per_page if 'per_page' in request.args else None,
+                           UserRole=UserRole,
+                           title='Manage Users')
+
+USERS_PAGE_SIZE = 50
+
+def _prefix_match(column, prefix):
+    """Case-insensitive 'starts with' that can use the lower(...) expression indexes."""
+    expr = db.func.lower(column)
+    prefix = prefix.lower()
+    if db.engine.dialect.name == 'sqlite':
+        # SQLite only uses an index for LIKE on NOCASE columns; a range over lower() hits the expression index
+        return and_(expr >= prefix, expr < prefix + '\U0010ffff')
+    return expr.startswith(prefix, autoescape=True)
 
 @admin_bp.route('/users/add', methods=['GET', 'POST'])
 @login_required
@@ -43,12 +101,15 @@ def add_user():
         user.set_password(form.password.data)
         user.force_password_change = True
 
-        if UserRole[form.role.data] == UserRole.EMPLOYEE and form.manager_id.data != 0:
-            user.manager_id = form.manager_id.data
-        elif UserRole[form.role.data] != UserRole.EMPLOYEE:
-            user.manager_id = None # Managers/Admins don't have managers in this system
+        if UserRole[form.role.data] != UserRole.ADMIN and form.manager_id.data != 0:
+            user.manager_id = form.manager_id.data # Employees and managers can report to a manager
+        else:
+            user.manager_id = None # Admins don't have managers in this system
 
         db.session.add(user)
+        db.session.flush()
+        org_hierarchy.insert_users([user.id])
+        bump_data_version(USERS_VERSION_KEY)
         db.session.commit()
         flash(f'User {user.name} added successfully!', 'success')
         return redirect(url_for('admin.manage_users'))
@@ -70,11 +131,14 @@ def edit_user(user_id):
     form.confirm_password.validators = [v for v in form.confirm_password.validators if not isinstance(v, type(request.method == 'POST'))]
 
 
-    # Re-populate manager_id choices, and remove current user from managers list if manager
-    managers_list = [(0, 'None')] + [(u.id, u.name) for u in User.query.filter_by(role=UserRole.MANAGER).filter(User.id != user_id).all()]
+    # Re-populate manager_id choices without the user and anyone below them (that would be a cycle)
+    managers_list = [(0, 'None')] + [(u.id, u.name) for u in User.query.filter_by(role=UserRole.MANAGER).filter(
+        User.id.notin_(org_hierarchy.subtree_ids_subquery(user_id, include_self=True))
+    ).order_by(User.name).all()]
     form.manager_id.choices = managers_list
 
     if form.validate_on_submit():
+        previous_manager_id = user.manager_id
         user.name = form.name.data
         user.email = form.email.data
         user.role = UserRole[form.role.data]
@@ -83,14 +147,23 @@ def edit_user(user_id):
             user.set_password(form.password.data)
             user.force_password_change = True
         
-        if UserRole[form.role.data] == UserRole.EMPLOYEE and form.manager_id.data != 0:
+        if UserRole[form.role.data] != UserRole.ADMIN and form.manager_id.data != 0:
             user.manager_id = form.manager_id.data
-        elif UserRole[form.role.data] != UserRole.EMPLOYEE:
-            user.manager_id = None
-        else: # employee without a manager or manager_id set to 0
+        else: # admin, or no manager selected
              user.manager_id = None
 
+        if user.manager_id != previous_manager_id:
+            try:
+                org_hierarchy.move_user(user.id, user.manager_id)
+            except ValueError as e:
+                db.session.rollback()
+                flash(str(e), 'danger')
+                return render_template('admin/add_edit_user.html', form=form, title='Edit User', is_edit=True, user=user)
+
+        bump_data_version(USERS_VERSION_KEY)
         db.session.commit()
+        if user.manager_id != previous_manager_id:
+            invalidate_team_summary(previous_manager_id, user.manager_id)
         flash(f'User {user.name} updated successfully!', 'success')
         return redirect(url_for('admin.manage_users'))
     elif request.method == 'GET':
@@ -110,23 +183,102 @@ def delete_user(user_id):
         return redirect(url_for('admin.manage_users'))
     
     # Import Leave model
-    from models import Leave
+    from models import Leave, LeaveTombstone, ChatConversation
     
-    # Disassociate managed employees
+    # Disassociate managed employees; each keeps their own reports
+    org_hierarchy.remove_user(user_id)
     for emp in user.managed_employees:
         emp.manager_id = None
     
-    # Delete all leave applications by this user
+    # Delete all leave applications by this user, leaving tombstones for calendar delta sync
+    deleted_at = datetime.datetime.utcnow()
+    db.session.execute(insert(LeaveTombstone).from_select(
+        ['leave_id', 'user_id', 'deleted_at'],
+        select(Leave.id, Leave.user_id, literal(deleted_at)).where(Leave.user_id == user_id)
+    ))
     Leave.query.filter_by(user_id=user_id).delete()
+    ledger.remove_user(user_id)
+    
+    # Delete the user's chat conversations
+    ChatConversation.query.filter_by(user_id=user_id).delete()
     
     # Update leaves approved by this user (set approved_by_id to None)
     Leave.query.filter_by(approved_by_id=user_id).update({Leave.approved_by_id: None})
     
+    manager_id = user.manager_id
     db.session.delete(user)
+    bump_data_version(USERS_VERSION_KEY)
     db.session.commit()
+    invalidate_team_summary(manager_id, user_id)
     flash(f'User {user.name} deleted successfully!', 'success')
     return redirect(url_for('admin.manage_users'))
 
+@admin_bp.route('/users/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_users():
+    """Step 1: upload a CSV/JSON file and get a dry-run report."""
+    form = UserImportForm()
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            entries = parse_user_file(upload.filename, upload.read())
+        except (UserImportError, UnicodeDecodeError) as e:
+            flash(f'Could not import {upload.filename}: ' + str(e).replace('\n', '; '), 'danger')
+            return render_template('admin/import_users.html', form=form, title='Import Users')
+
+        report = plan_import(entries)
+        confirm_form = None
+        if report['new'] and not report['errors']:
+            confirm_form = UserImportConfirmForm(token=stage_import(report['new'], current_user.id))
+        return render_template('admin/import_users.html', form=form, confirm_form=confirm_form, report=report,
+                               filename=upload.filename, title='Import Users')
+    return render_template('admin/import_users.html', form=form, title='Import Users')
+
+@admin_bp.route('/users/import/confirm', methods=['POST'])
+@login_required
+@admin_required
+def confirm_import_users():
+    """Step 2: create the accounts and show their temporary passwords once."""
+    form = UserImportConfirmForm()
+    entries = take_staged_import(form.token.data, current_user.id) if form.validate_on_submit() else None
+    if entries is None:
+        flash('The import could not be confirmed. Please upload the file again.', 'danger')
+        return redirect(url_for('admin.import_users'))
+
+    # Validate again in case accounts were added since the dry run
+    report = plan_import(entries)
+    if report['errors']:
+        flash('Users changed since the dry run: ' + '; '.join(report['errors']), 'danger')
+        return redirect(url_for('admin.import_users'))
+    try:
+        created = provision_users(report['new'])
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error importing users: {e}. Batches written before the error were kept; run the dry run again to see what is left.', 'danger')
+        return redirect(url_for('admin.import_users'))
+    flash(f'{len(created)} users created. Share the temporary passwords below; they are not shown again.', 'success')
+    return render_template('admin/import_users.html', form=UserImportForm(), created=created, title='Import Users')
+
+# --- Reports ---
+@admin_bp.route('/absence_heatmap')
+@login_required
+@admin_required
+def absence_heatmap_report():
+    """
+    Daily absence counts for the whole org, or one manager's team with
+    ?manager_id= (everyone below them with &scope=subtree); see absence_heatmap.py.
+    Query parameters: start, end (YYYY-MM-DD), status (e.g. APPROVED,PENDING).
+    """
+    try:
+        start_date, end_date, statuses = parse_heatmap_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    manager_id = request.args.get('manager_id', type=int)
+    subtree = request.args.get('scope') == 'subtree'
+    user_ids = managed_employee_ids_subquery(manager_id, subtree=subtree) if manager_id else None
+    return jsonify(absence_heatmap(start_date, end_date, statuses, user_ids))
+
 # --- Holiday Management ---
 @admin_bp.route('/holidays')
 @login_required
@@ -144,6 +296,8 @@ def add_holiday():
         holiday = Holiday(date=form.date.data, name=form.name.data, is_critical=form.is_critical.data)
         try:
             db.session.add(holiday)
+            invalidate_holiday_index()
+            ledger.refresh_for_holiday_dates([holiday.date])
             db.session.commit()
             flash(f'Holiday "{holiday.name}" added successfully!', 'success')
             return redirect(url_for('admin.manage_holidays'))
@@ -160,9 +314,12 @@ def edit_holiday(holiday_id):
     form = HolidayForm(obj=holiday)
     if form.validate_on_submit():
         try:
+            old_date = holiday.date
             holiday.date = form.date.data
             holiday.name = form.name.data
             holiday.is_critical = form.is_critical.data
+            invalidate_holiday_index()
+            ledger.refresh_for_holiday_dates({old_date, holiday.date})
             db.session.commit()
             flash(f'Holiday "{holiday.name}" updated successfully!', 'success')
             return redirect(url_for('admin.manage_holidays'))
@@ -179,6 +336,59 @@ def edit_holiday(holiday_id):
 def delete_holiday(holiday_id):
     holiday = Holiday.query.get_or_404(holiday_id)
     db.session.delete(holiday)
+    invalidate_holiday_index()
+    ledger.refresh_for_holiday_dates([holiday.date])
     db.session.commit()
     flash(f'Holiday "{holiday.name}" deleted successfully!', 'success')
-    return redirect(url_for('admin.manage_holidays'))
\ No newline at end of file
+    return redirect(url_for('admin.manage_holidays'))
+
+@admin_bp.route('/holidays/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_holidays():
+    """Step 1: upload a CSV/.ics file and preview what the import would change."""
+    form = HolidayImportForm()
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            entries = parse_holiday_file(upload.filename, upload.read())
+        except (HolidayImportError, UnicodeDecodeError) as e:
+            flash(f'Could not import {upload.filename}: ' + str(e).replace('\n', '; '), 'danger')
+            return render_template('admin/import_holidays.html', form=form, title='Import Holidays')
+
+        diff = diff_holidays(entries)
+        confirm_form = HolidayImportConfirmForm(payload=json.dumps(
+            [[e.date.isoformat(), e.name, e.is_critical] for e in entries]
+        ))
+        return render_template('admin/import_holidays.html', form=form, confirm_form=confirm_form, diff=diff,
+                               filename=upload.filename, title='Import Holidays')
+    return render_template('admin/import_holidays.html', form=form, title='Import Holidays')
+
+@admin_bp.route('/holidays/import/confirm', methods=['POST'])
+@login_required
+@admin_required
+def confirm_import_holidays():
+    """Step 2: upsert the previewed holidays in one transaction."""
+    form = HolidayImportConfirmForm()
+    if not form.validate_on_submit():
+        flash('The import could not be confirmed. Please upload the file again.', 'danger')
+        return redirect(url_for('admin.import_holidays'))
+    try:
+        entries = [HolidayEntry(datetime.date.fromisoformat(d), name, bool(critical))
+                   for d, name, critical in json.loads(form.payload.data)]
+    except (ValueError, TypeError):
+        flash('The import could not be confirmed. Please upload the file again.', 'danger')
+        return redirect(url_for('admin.import_holidays'))
+
+    # Re-diff against the current table in case holidays changed since the preview
+    diff = diff_holidays(entries)
+    try:
+        written = apply_import(diff)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error importing holidays: {e}', 'danger')
+        return redirect(url_for('admin.import_holidays'))
+    flash(f"Holiday import complete: {len(diff['added'])} added, {len(diff['updated'])} updated, "
+          f"{len(diff['unchanged'])} unchanged ({written} written).", 'success')
+    return redirect(url_for('admin.manage_holidays'))
@@ -0,0 +1,161 @@
+"""
+Versioned JSON dashboard payloads (/api/v1/...).
+
+Each endpoint returns everything its role's dashboard shows in one compact
+document, built with a fixed number of queries whatever the team size:
+
+    {
+        "version": 1, "role": "employee" | "manager", "date": "YYYY-MM-DD",
+        "greeting": {...}, "summary": {...},
+        # employee: "my_leaves", "team_leaves"
+        # manager:  "scope", "has_subtree", "pending_leaves", "recent_leaves"
+    }
+
+Leaves are objects with short keys (id, uid, name, type, status, start,
+end; see _leave_json). The first query of every request is a fingerprint
+of the data the payload depends on (leave count and last update
+of the relevant leaves, last leave deletion, holiday and users versions);
+its hash is the ETag, so a client revalidating with If-None-Match gets a
+304 after that single query.
+"""
+import datetime
+import hashlib
+from flask import Blueprint, jsonify, make_response, request
+from flask_login import login_required, current_user
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import contains_eager, joinedload
+from extensions import db
+from models import DataVersion, Leave, LeaveStatus, LeaveTombstone, User
+from holiday_index import get_holiday_index, HOLIDAY_VERSION_KEY
+from calendar_feed import USERS_VERSION_KEY
+import org_hierarchy
+from utils import (employee_required, manager_required, get_leave_summary, get_team_leave_summary,
+                   generate_dashboard_greeting, managed_employee_ids_subquery)
+
+API_VERSION = 1
+
+api_bp = Blueprint('api', __name__, url_prefix=f'/api/v{API_VERSION}')
+
+
+def _version_subquery(name):
+    return select(func.coalesce(func.max(DataVersion.version), 0)).where(DataVersion.name == name).scalar_subquery()
+
+
+def _fingerprint(user_ids):
+    """
+    One SELECT over the leaves of user_ids (a SELECT of ids): count, last
+    update, last deletion among them and the holiday and users versions.
+    """
+    leaves = select(func.count(Leave.id), func.max(Leave.updated_at)).where(Leave.user_id.in_(user_ids)).subquery()
+    return db.session.execute(select(
+        leaves,
+        select(func.max(LeaveTombstone.deleted_at)).where(LeaveTombstone.user_id.in_(user_ids)).scalar_subquery(),
+        _version_subquery(HOLIDAY_VERSION_KEY),
+        _version_subquery(USERS_VERSION_KEY),
+    )).one()
+
+
+def _conditional_response(parts, build_payload):
+    """
+    Answers 304 if the client's If-None-Match matches the ETag of `parts`,
+    otherwise the JSON of build_payload().
+    """
+    etag = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = jsonify(build_payload())
+    response.set_etag(etag)
+    # Always revalidate: the browser may reuse its copy only after a 304
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _leave_json(leave, employee_name=None):
+    return {
+        'id': leave.id,
+        'uid': leave.user_id,
+        'name': employee_name if employee_name is not None else leave.employee.name,
+        'type': leave.leave_type.value,
+        'status': leave.status.value,
+        'start': leave.start_date.isoformat(),
+        'end': leave.end_date.isoformat(),
+    }
+
+
+@api_bp.route('/employee/dashboard')
+@login_required
+@employee_required
+def employee_dashboard():
+    # The payload covers the user's own leaves and those of their teammates
+    members = select(User.id).where(User.id == current_user.id)
+    if current_user.manager_id:
+        members = select(User.id).where(or_(User.id == current_user.id, User.manager_id == current_user.manager_id))
+    fingerprint = _fingerprint(members)
+    today = datetime.date.today()
+    holiday_version = fingerprint[3]
+
+    def build_payload():
+        my_leaves = current_user.leaves_applied.order_by(Leave.start_date.desc()).limit(10).all()
+        team_leaves = []
+        if current_user.manager_id:
+            team_leaves = Leave.query.join(Leave.employee).options(contains_eager(Leave.employee)).filter(
+                User.manager_id == current_user.manager_id,
+                User.id != current_user.id
+            ).order_by(Leave.start_date.desc()).limit(10).all()
+        return {
+            'version': API_VERSION,
+            'role': 'employee',
+            'date': today.isoformat(),
+            'greeting': generate_dashboard_greeting(current_user, get_holiday_index(holiday_version)),
+            'summary': get_leave_summary(current_user),
+            'my_leaves': [dict(_leave_json(leave, current_user.name), reason=leave.reason) for leave in my_leaves],
+            'team_leaves': [_leave_json(leave) for leave in team_leaves],
+        }
+
+    return _conditional_response(('employee', current_user.id, today) + tuple(fingerprint), build_payload)
+
+
+@api_bp.route('/manager/dashboard')
+@login_required
+@manager_required
+def manager_dashboard():
+    # Approvals stay with the direct manager; ?scope=subtree widens the summary
+    scope = 'subtree' if request.args.get('scope') == 'subtree' else 'team'
+    fingerprint = _fingerprint(managed_employee_ids_subquery(current_user.id, subtree=scope == 'subtree'))
+    today = datetime.date.today()
+    holiday_version = fingerprint[3]
+
+    def build_payload():
+        managed_employee_ids = managed_employee_ids_subquery(current_user.id)
+        pending_leaves = Leave.query.options(joinedload(Leave.employee)).filter(
+            Leave.user_id.in_(managed_employee_ids),
+            Leave.status == LeaveStatus.PENDING
+        ).order_by(Leave.applied_at.asc()).all()
+        recent_leaves = Leave.query.options(
+            joinedload(Leave.employee), joinedload(Leave.approver)
+        ).filter(
+            Leave.user_id.in_(managed_employee_ids),
+            Leave.status.in_([LeaveStatus.APPROVED, LeaveStatus.REJECTED])
+        ).order_by(Leave.approved_at.desc()).limit(10).all()
+        return {
+            'version': API_VERSION,
+            'role': 'manager',
+            'date': today.isoformat(),
+            'scope': scope,
+            'has_subtree': org_hierarchy.has_subtree(current_user.id),
+            'greeting': generate_dashboard_greeting(current_user, get_holiday_index(holiday_version)),
+            'summary': get_team_leave_summary(current_user, subtree=scope == 'subtree', holiday_version=holiday_version),
+            'pending_leaves': [
+                dict(_leave_json(leave), reason=leave.reason, document=bool(leave.document_path),
+                     applied=leave.applied_at.isoformat())
+                for leave in pending_leaves
+            ],
+            'recent_leaves': [
+                dict(_leave_json(leave), by=leave.approver.name if leave.approver else None,
+                     at=leave.approved_at.isoformat() if leave.approved_at else None)
+                for leave in recent_leaves
+            ],
+        }
+
+    return _conditional_response(('manager', current_user.id, scope, today) + tuple(fingerprint), build_payload)
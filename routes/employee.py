@@ -1,14 +1,23 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, Response
 from forms import LeaveApplicationForm
 from models import User, Leave, LeaveStatus, LeaveType, Holiday
-from extensions import db
-from utils import employee_required, is_holiday_or_critical_day, allowed_file, get_leave_summary, generate_dashboard_greeting
+from extensions import db, cache
+import ledger
+from holiday_index import get_holiday_index
+from leave_planner import plan_leave, MAX_LEAVE_DAYS
+from team_coverage import check_team_coverage, coverage_message
+from calendar_feed import calendar_feed_response, parse_calendar_range
+from utils import employee_required, allowed_file, get_leave_summary, generate_dashboard_greeting, invalidate_team_summary, managed_employee_ids_subquery
 from flask_login import login_required, current_user
+from sqlalchemy.orm import contains_eager
 import os
 import uuid
 import datetime
 import json
-from openai import AzureOpenAI
+from llm import get_llm_client, get_llm_deployment
+from chat_pool import get_chat_pool, ChatPoolSaturated
+from chat_history import get_history, save_history
+from instrumentation import track_llm
 
 employee_bp = Blueprint('employee', __name__, url_prefix='/employee')
 
@@ -18,20 +27,13 @@ employee_bp = Blueprint('employee', __name__, url_prefix='/employee')
 def dashboard():
     my_leaves = current_user.leaves_applied.order_by(Leave.start_date.desc()).limit(10).all()
     
-    # Get team leaves (for employees under the same manager)
+    # Get team leaves (for employees under the same manager, excluding current user)
     team_leaves = []
-    if current_user.manager: # if current user has a manager
-        # Get all employees under the same manager, excluding current user
-        team_members = current_user.manager.managed_employees.filter(
+    if current_user.manager_id: # if current user has a manager
+        team_leaves = Leave.query.join(Leave.employee).options(contains_eager(Leave.employee)).filter(
+            User.manager_id == current_user.manager_id,
             User.id != current_user.id
-        ).all()
-        
-        # Get leaves for those team members
-        if team_members:
-            team_member_ids = [member.id for member in team_members]
-            team_leaves = Leave.query.filter(
-                Leave.user_id.in_(team_member_ids)
-            ).order_by(Leave.start_date.desc()).limit(10).all()
+        ).order_by(Leave.start_date.desc()).limit(10).all()
             
     summary = get_leave_summary(current_user)
     
@@ -59,13 +61,16 @@ def apply_leave():
             return render_template('employee/apply_leave.html', form=form, title='Apply for Leave')
 
         # Check for holidays/critical days
-        current_date = start_date
-        while current_date <= end_date:
-            if is_holiday_or_critical_day(current_date):
-                holiday = Holiday.query.filter_by(date=current_date).first()
-                flash(f'Cannot apply for leave on {current_date.strftime("%Y-%m-%d")} which is a {holiday.name} ({ "Critical Day" if holiday.is_critical else "Holiday"}).', 'danger')
-                return render_template('employee/apply_leave.html', form=form, title='Apply for Leave')
-            current_date += datetime.timedelta(days=1)
+        holiday = get_holiday_index().first_blocked_day(start_date, end_date)
+        if holiday:
+            flash(f'Cannot apply for leave on {holiday.date.strftime("%Y-%m-%d")} which is a {holiday.name} ({ "Critical Day" if holiday.is_critical else "Holiday"}).', 'danger')
+            return render_template('employee/apply_leave.html', form=form, title='Apply for Leave')
+
+        # Check how many teammates are already out
+        coverage = check_team_coverage(current_user, start_date, end_date)
+        if coverage and current_app.config['TEAM_COVERAGE_MODE'] == 'block':
+            flash(f'Cannot apply for this leave: {coverage_message(coverage)}', 'danger')
+            return render_template('employee/apply_leave.html', form=form, title='Apply for Leave')
         
         document_path = None
         if form.leave_type.data == LeaveType.SICK.name and form.document.data:
@@ -93,8 +98,12 @@ def apply_leave():
             document_path=document_path
         )
         db.session.add(leave)
+        ledger.record_leave_applied(leave)
         db.session.commit()
+        invalidate_team_summary(current_user.manager_id)
         flash('Leave application submitted successfully!', 'success')
+        if coverage:
+            flash(f'Heads-up: {coverage_message(coverage)} Your manager may ask you to move it.', 'warning')
         return redirect(url_for('employee.dashboard'))
 
     return render_template('employee/apply_leave.html', form=form, title='Apply for Leave')
@@ -104,65 +113,38 @@ def apply_leave():
 @login_required
 @employee_required
 def get_leaves_for_calendar():
-    start_str = request.args.get('start')
-    end_str = request.args.get('end')
-
-    start_date = datetime.datetime.fromisoformat(start_str.replace('Z', '+00:00')).date() if start_str else None
-    end_date = datetime.datetime.fromisoformat(end_str.replace('Z', '+00:00')).date() if end_str else None
+    start_date, end_date = parse_calendar_range(request.args)
 
-    # Get my leaves
-    my_leaves_query = current_user.leaves_applied
-    if start_date and end_date:
-        my_leaves_query = my_leaves_query.filter(Leave.start_date <= end_date, Leave.end_date >= start_date)
-    my_leaves = my_leaves_query.all()
-
-    # Get team leaves (similar logic as dashboard)
-    team_leaves = []
-    if current_user.manager:
-        team_member_ids = [member.id for member in current_user.manager.managed_employees.all() if member.id != current_user.id]
-        if team_member_ids:
-            team_leaves_query = Leave.query.filter(Leave.user_id.in_(team_member_ids))
-            if start_date and end_date:
-                team_leaves_query = team_leaves_query.filter(Leave.start_date <= end_date, Leave.end_date >= start_date)
-            team_leaves = team_leaves_query.all()
-    
-    holidays = Holiday.query.all() # Fetch all holidays
+    # My leaves plus team leaves (similar logic as dashboard)
+    user_ids = [current_user.id]
+    if current_user.manager_id:
+        user_ids += db.session.scalars(
+            managed_employee_ids_subquery(current_user.manager_id).where(User.id != current_user.id)
+        ).all()
 
-    events = []
-    for leave in my_leaves:
+    def leave_event(leave):
+        is_mine = leave.user_id == current_user.id
         color = ''
-        if leave.status == LeaveStatus.APPROVED:
-            color = 'green'
-        elif leave.status == LeaveStatus.PENDING:
-            color = 'orange' # Or yellow
-        elif leave.status == LeaveStatus.REJECTED:
-            color = 'red'
-        
-        events.append({
-            'title': f'{leave.employee.name} - {leave.leave_type.value} ({leave.status.value})',
-            'start': leave.start_date.isoformat(),
-            'end': (leave.end_date + datetime.timedelta(days=1)).isoformat(), # FullCalendar end date is exclusive
-            'color': color,
-            'extendedProps': {
-                'status': leave.status.value,
-                'type': leave.leave_type.value,
-                'reason': leave.reason,
-                'document_path': leave.document_path,
-                'is_mine': True
-            }
-        })
-    
-    for leave in team_leaves:
-        color = ''
-        if leave.status == LeaveStatus.APPROVED:
-            color = '#87CEEB' # light blue for team approved
-        elif leave.status == LeaveStatus.PENDING:
-            color = '#ADD8E6' # lighter blue for team pending
-        elif leave.status == LeaveStatus.REJECTED:
-            color = '#FFB6C1' # light red for team rejected
-        
-        events.append({
-            'title': f'{leave.employee.name} - {leave.leave_type.value}',
+        if is_mine:
+            if leave.status == LeaveStatus.APPROVED:
+                color = 'green'
+            elif leave.status == LeaveStatus.PENDING:
+                color = 'orange' # Or yellow
+            elif leave.status == LeaveStatus.REJECTED:
+                color = 'red'
+            title = f'{leave.employee.name} - {leave.leave_type.value} ({leave.status.value})'
+        else:
+            if leave.status == LeaveStatus.APPROVED:
+                color = '#87CEEB' # light blue for team approved
+            elif leave.status == LeaveStatus.PENDING:
+                color = '#ADD8E6' # lighter blue for team pending
+            elif leave.status == LeaveStatus.REJECTED:
+                color = '#FFB6C1' # light red for team rejected
+            title = f'{leave.employee.name} - {leave.leave_type.value}'
+
+        return {
+            'id': leave.id,
+            'title': title,
             'start': leave.start_date.isoformat(),
             'end': (leave.end_date + datetime.timedelta(days=1)).isoformat(), # FullCalendar end date is exclusive
             'color': color,
@@ -171,63 +153,33 @@ def get_leaves_for_calendar():
                 'type': leave.leave_type.value,
                 'reason': leave.reason,
                 'document_path': leave.document_path,
-                'is_mine': False
+                'is_mine': is_mine
             }
-        })
+        }
 
-     # Query for holidays and critical days separately
-    holidays = Holiday.query.filter_by(is_critical=False).all()
-    critical_days = Holiday.query.filter_by(is_critical=True).all()
-
-    for holiday in holidays:
-        events.append({
-            'title': f'{holiday.name} (Holiday)',
-            'start': holiday.date.isoformat(),
-            'end': (holiday.date + datetime.timedelta(days=1)).isoformat(),
-            'backgroundColor': '#ced4da', # A neutral grey for days off
-            'borderColor': '#ced4da',
-            'display': 'background',
-        })
+    return calendar_feed_response(user_ids, start_date, end_date, leave_event)
 
-    # Loop for CRITICAL DAYS (no leave allowed)
-    for day in critical_days:
-        events.append({
-            'title': f'{day.name} (Critical Day)',
-            'start': day.date.isoformat(),
-            'end': (day.date + datetime.timedelta(days=1)).isoformat(),
-            'backgroundColor': '#f8d7da', # A light, cautionary red
-            'borderColor': '#f8d7da',
-            'display': 'background',
-        })
 
-    return jsonify(events)
+@employee_bp.route('/leave_planner')
+@login_required
+@employee_required
+def leave_planner():
+    """Best placements of ?days=N leave days over the next year (?limit=, default 5)."""
+    num_days = request.args.get('days', 1, type=int)
+    limit = min(request.args.get('limit', 5, type=int), 20)
+    if not 1 <= num_days <= MAX_LEAVE_DAYS:
+        return jsonify({"error": f"days must be between 1 and {MAX_LEAVE_DAYS}"}), 400
+    return jsonify({"days": num_days, "suggestions": plan_leave(num_days, limit=limit)})
 
 def suggest_leave_dates(num_days: int = 1):
     print(f"🤖 Tool called: suggest_leave_dates(num_days={num_days})")
-    suggestions = []
-    today = datetime.date.today()
-    future_date = today + datetime.timedelta(days=365)
-    company_holidays = Holiday.query.filter(Holiday.is_critical == False, Holiday.date >= today,
-        Holiday.date <= today + datetime.timedelta(days=90), Holiday.date.between(today, future_date)).all()
-    for i in range(365):
-        current_date = today + datetime.timedelta(days=i)
-        if current_date.weekday() == 0 and current_date in company_holidays:
-            leave_date = current_date - datetime.timedelta(days=3)
-            if leave_date > today:
-                suggestions.append({
-                    "leave_date": leave_date.isoformat(), "holiday_date": current_date.isoformat(),
-                    "reason": f"Take Friday off for a 4-day weekend holiday on Monday."
-                })
-        if current_date.weekday() == 4 and current_date in company_holidays:
-            leave_date = current_date + datetime.timedelta(days=3)
-            if leave_date > today:
-                suggestions.append({
-                    "leave_date": leave_date.isoformat(), "holiday_date": current_date.isoformat(),
-                    "reason": f"Take Monday off for a 4-day weekend holiday on Friday."
-                })
+    try:
+        suggestions = plan_leave(int(num_days), limit=3)
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
     if not suggestions:
         return json.dumps({"message": "I couldn't find any upcoming long weekend opportunities."})
-    return json.dumps(suggestions[0])
+    return json.dumps({"suggestions": suggestions})
 
 def file_leave(start_date: str, end_date: str):
     print(f"🤖 Tool called: file_leave(start_date='{start_date}', end_date='{end_date}')")
@@ -239,9 +191,26 @@ def file_leave(start_date: str, end_date: str):
             end_date=datetime.date.fromisoformat(end_date),
             reason='Vacation leave filed by Leavy Chatbot',
         )
+        if leave.start_date > leave.end_date:
+            return json.dumps({"status": "error", "message": "The end date cannot be before the start date."})
+        # Same holiday/critical day rule as apply_leave
+        holiday = get_holiday_index().first_blocked_day(leave.start_date, leave.end_date)
+        if holiday:
+            kind = "Critical Day" if holiday.is_critical else "Holiday"
+            return json.dumps({"status": "error", "message": (
+                f"The leave was not filed: {holiday.date.strftime('%Y-%m-%d')} is {holiday.name} ({kind})."
+            )})
+        coverage = check_team_coverage(current_user, leave.start_date, leave.end_date)
+        if coverage and current_app.config['TEAM_COVERAGE_MODE'] == 'block':
+            return json.dumps({"status": "error", "message": f"The leave was not filed: {coverage_message(coverage)}"})
         db.session.add(leave)
+        ledger.record_leave_applied(leave)
         db.session.commit()
-        return json.dumps({"status": "success", "message": f"Leave from {start_date} to {end_date} has been filed."})
+        invalidate_team_summary(current_user.manager_id)
+        message = f"Leave from {start_date} to {end_date} has been filed."
+        if coverage:
+            message += f" Note: {coverage_message(coverage)}"
+        return json.dumps({"status": "success", "message": message})
     except Exception as e:
         print(f"❌ Error filing leave: {e}")
         return json.dumps({"status": "error", "message": "There was an error filing your leave."})
@@ -259,7 +228,9 @@ def file_sick_leave(reason: str):
             reason=reason,
         )
         db.session.add(leave)
+        ledger.record_leave_applied(leave)
         db.session.commit()
+        invalidate_team_summary(current_user.manager_id)
         return json.dumps({
             "status": "success",
             "message": f"Sick leave for {today_str} has been filed. Reason: {reason}"
@@ -274,17 +245,6 @@ available_functions = {
     "file_sick_leave": file_sick_leave,
 }
 
-# Helper to initialize history
-def get_history(system_prompt):
-    if "messages" not in session:
-        session["messages"] = [
-            {"role": "system", "content": system_prompt}
-        ]
-    return session["messages"]
-
-def save_history(messages):
-    session["messages"] = messages
-
 # Convert assistant message with tool calls into a pure dict for safe storage
 def to_assistant_dict(msg):
     out = {"role": "assistant", "content": msg.content}
@@ -307,8 +267,8 @@ tools = [
         "type": "function",
         "function": {
             "name": "suggest_leave_dates",
-            "description": "Suggests an optimal date to file for a VACATION leave to create a long weekend.",
-            "parameters": {"type": "object", "properties": {"num_days": {"type": "integer", "description": "The number of leave days the user wants to take.", "default": 1}}, "required": []},
+            "description": "Suggests the best dates in the next year to file a VACATION leave of num_days days, ranked by the longest run of consecutive days off (weekends and holidays included).",
+            "parameters": {"type": "object", "properties": {"num_days": {"type": "integer", "description": "The number of leave days the user wants to take (1-15).", "default": 1}}, "required": []},
         },
     },
     {
@@ -338,63 +298,104 @@ tools = [
     }
 ]
 
-@employee_bp.route('/chat', methods=['POST'])
-@login_required
-@employee_required
-def chat():
-    try:
-        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-        deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
-        subscription_key = os.getenv("AZURE_OPENAI_API_KEY")
-        api_version = os.getenv("AZURE_OPENAI_API_VERSION")
- 
-        client = AzureOpenAI(
-            azure_endpoint=endpoint,
-            api_key=subscription_key,
-            api_version=api_version,
+# Static part of the system prompt. It comes first and never changes, so the
+# provider can reuse its cached prefix across users and days; the dated holiday
+# context is appended after it.
+SYSTEM_PROMPT_INSTRUCTIONS = """
+You are 'Leavy', a friendly and brilliant AI assistant integrated into a company's Leave Tracker app.
+You have two expert personas you must embody:
+
+1.  **Expert HR Leave Planner:** When asked about leave schedules, filing dates, or long weekends, you MUST use the provided company data. Your goal is to help employees maximize their vacation time by identifying strategic days to take leave.
+2.  **Inspirational Travel Advisor:** When asked for vacation ideas, destinations, or travel tips, you should provide creative and helpful suggestions specifically for travel within the Philippines.
+
+Your workflows are:
+1. **Vacation Leave**: If the user wants vacation, FIRST use `suggest_leave_dates`. PRESENT the suggestion and ask for confirmation. After confirmation, use `file_leave`.
+2. **Sick Leave**: If the user says they are sick, FIRST **ask for confirmation** before filing. After they confirm, use the `file_sick_leave` tool for today's date.
+
+**INSTRUCTIONS:**
+- Always respond in a friendly, conversational, and encouraging tone.
+- Use Markdown for formatting (headings, lists, bold text) to make your answers easy to read.
+- Keep responses concise and to the point.
+- Infer the user's intent to decide which persona to use. If they ask "Where and when should I take a vacation?", use BOTH personas.
+"""
+
+def holiday_prompt_context():
+    """
+    The date-dependent part of the system prompt: today's date plus the
+    holidays and critical days of the next 365 days. Cached per holiday
+    version and day, so it is rebuilt only when an admin edits holidays or
+    the date rolls over.
+    """
+    today = datetime.date.today()
+    index = get_holiday_index()
+    key = f"chat_context:{index.version}:{today.isoformat()}"
+    context = cache.get(key)
+    if context is None:
+        upcoming = index.between(today, today + datetime.timedelta(days=365))
+        holidays = ', '.join(f'{h.name} on {h.date.strftime("%Y-%m-%d")}' for h in upcoming if not h.is_critical)
+        critical_days = ', '.join(f'{c.name} on {c.date.strftime("%Y-%m-%d")}' for c in upcoming if c.is_critical)
+        context = (
+            "**CONTEXT FOR YOUR HR PERSONA:**\n"
+            f"- Today's Date: {today.strftime('%Y-%m-%d')}\n"
+            f"- Company Holidays (LEAVE IS NOT ALLOWED) (days off): {holidays or 'None provided.'}\n"
+            f"- Company Critical Days (LEAVE IS NOT ALLOWED): {critical_days or 'None provided.'}\n"
         )
+        cache.set(key, context, ttl=86400)
+    return context
+
+def build_system_prompt():
+    return SYSTEM_PROMPT_INSTRUCTIONS + "\n" + holiday_prompt_context()
+
+def run_tool_calls(tool_calls, messages):
+    """Executes the model's tool calls and appends their results to messages."""
+    for tool_call in tool_calls:
+        function_name = tool_call["function"]["name"]
+        function_to_call = available_functions.get(function_name)
+        if not function_to_call:
+            # If unknown tool, tell the model
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call["id"],
+                "name": function_name,
+                "content": json.dumps({"error": "Unknown function"})
+            })
+            continue
+
+        try:
+            function_args = json.loads(tool_call["function"]["arguments"] or "{}")
+        except json.JSONDecodeError:
+            function_args = {}
+
+        function_response = function_to_call(**function_args)
 
-        # Get context from our application's database
-        today = datetime.date.today()
-        future_date = today + datetime.timedelta(days=365)
-        company_holidays = Holiday.query.filter(Holiday.is_critical == False, Holiday.date.between(today, future_date)).all()
-        company_critical_days = Holiday.query.filter(Holiday.is_critical == True, Holiday.date.between(today, future_date)).all()
-
-        system_prompt = f"""
-        You are 'Leavy', a friendly and brilliant AI assistant integrated into a company's Leave Tracker app.
-        You have two expert personas you must embody:
-
-        1.  **Expert HR Leave Planner:** When asked about leave schedules, filing dates, or long weekends, you MUST use the provided company data. Your goal is to help employees maximize their vacation time by identifying strategic days to take leave.
-        2.  **Inspirational Travel Advisor:** When asked for vacation ideas, destinations, or travel tips, you should provide creative and helpful suggestions specifically for travel within the Philippines.
-
-        **CONTEXT FOR YOUR HR PERSONA:**
-        "- Today's Date: {today.strftime('%Y-%m-%d')}"
-        "- Company Holidays (LEAVE IS NOT ALLOWED) (days off): {', '.join([f'{h.name} on {h.date.strftime("%Y-%m-%d")}' for h in company_holidays]) or 'None provided.'}"
-        "- Company Critical Days (LEAVE IS NOT ALLOWED): {', '.join([f'{c.name} on {c.date.strftime("%Y-%m-%d")}' for c in company_critical_days]) or 'None provided.'}"
-
-        "Your workflows are:\n"
-            "1. **Vacation Leave**: If the user wants vacation, FIRST use `suggest_leave_dates`. PRESENT the suggestion and ask for confirmation. After confirmation, use `file_leave`.\n"
-            "2. **Sick Leave**: If the user says they are sick, FIRST **ask for confirmation** before filing. After they confirm, use the `file_sick_leave` tool for today's date."
-
-        **INSTRUCTIONS:**
-        - Always respond in a friendly, conversational, and encouraging tone.
-        - Use Markdown for formatting (headings, lists, bold text) to make your answers easy to read.
-        - Keep responses concise and to the point.
-        - Infer the user's intent to decide which persona to use. If they ask "Where and when should I take a vacation?", use BOTH personas.
-        """
-        user_input = request.json.get("message", "").strip()
-        if not user_input:
-            return jsonify({"error": "Empty message"}), 400
-        
-        # 1) Load history and append current user turn
-        messages = get_history(system_prompt)
         messages.append({
-            "role": "user",
-            "content": [
-                {"type": "text", "text": user_input}
-            ]
+            "role": "tool",
+            "tool_call_id": tool_call["id"],
+            "name": function_name,
+            "content": function_response
         })
-        
+
+def start_conversation_turn():
+    """Loads history and appends the current user turn; returns None for an empty message."""
+    user_input = (request.json or {}).get("message", "").strip()
+    if not user_input:
+        return None
+
+    messages = get_history(build_system_prompt())
+    messages.append({
+        "role": "user",
+        "content": [
+            {"type": "text", "text": user_input}
+        ]
+    })
+    return messages
+
+def complete_chat_turn(messages):
+    """Runs one chat turn (including any tool calls) and returns the assistant's reply."""
+    client = get_llm_client()
+    deployment = get_llm_deployment()
+
+    with track_llm():
         completion = client.chat.completions.create(
             model=deployment,
             messages=messages,
@@ -405,62 +406,148 @@ def chat():
             top_p=0.95
         )
 
-        response_message = completion.choices[0].message
-        
-        # 3) If the model decided to call tools
-        if getattr(response_message, "tool_calls", None):
-            # Store the assistant turn with its tool_calls
-            messages.append(to_assistant_dict(response_message))
-
-            # Execute tools and add tool results to history
-            for tool_call in response_message.tool_calls:
-                function_name = tool_call.function.name
-                function_to_call = available_functions.get(function_name)
-                if not function_to_call:
-                    # If unknown tool, tell the model
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": function_name,
-                        "content": json.dumps({"error": "Unknown function"})
-                    })
-                    continue
-
-                try:
-                    function_args = json.loads(tool_call.function.arguments or "{}")
-                except json.JSONDecodeError:
-                    function_args = {}
-
-                function_response = function_to_call(**function_args)
-
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_call.id,
-                    "name": function_name,
-                    "content": function_response
-                })
-
-            # 4) Ask the model to produce the final assistant message after tool outputs
+    response_message = completion.choices[0].message
+    
+    # If the model decided to call tools
+    if getattr(response_message, "tool_calls", None):
+        # Store the assistant turn with its tool_calls
+        assistant_turn = to_assistant_dict(response_message)
+        messages.append(assistant_turn)
+
+        # Execute tools and add tool results to history
+        run_tool_calls(assistant_turn["tool_calls"], messages)
+
+        # Ask the model to produce the final assistant message after tool outputs
+        with track_llm():
             second_response = client.chat.completions.create(
                 model=deployment,
                 messages=messages,
                 max_tokens=800,
                 temperature=0.7
             )
-            final_assistant = second_response.choices[0].message
-            final_message = final_assistant.content
-            messages.append({"role": "assistant", "content": final_message})
+        final_assistant = second_response.choices[0].message
+        final_message = final_assistant.content
+        messages.append({"role": "assistant", "content": final_message})
 
-        else:
-            # No tool calls — just a normal assistant reply
-            final_message = response_message.content
-            messages.append({"role": "assistant", "content": final_message})
+    else:
+        # No tool calls — just a normal assistant reply
+        final_message = response_message.content
+        messages.append({"role": "assistant", "content": final_message})
+
+    # Persist history so the next "Yes" is in context
+    save_history(messages)
+    return final_message
 
-        # 5) Persist history so the next "Yes" is in context
-        save_history(messages)
+def chat_busy_response():
+    response = jsonify({"error": "Leavy is busy helping other people right now. Please try again in a few seconds."})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(current_app.config['CHAT_RETRY_AFTER'])
+    return response
 
+@employee_bp.route('/chat', methods=['POST'])
+@login_required
+@employee_required
+def chat():
+    try:
+        # Load history and append current user turn
+        messages = start_conversation_turn()
+        if messages is None:
+            return jsonify({"error": "Empty message"}), 400
+
+        # The LLM round trips run on the bounded chat pool. This thread still waits for them; the pool
+        # caps concurrent chat turns and rejects this one at once (503 below) when every slot is taken
+        final_message = get_chat_pool().run(lambda: complete_chat_turn(messages))
         return jsonify({"reply": final_message})
 
+    except ChatPoolSaturated:
+        return chat_busy_response()
     except Exception as e:
         print(f"Error in /chat route: {e}")
-        return jsonify({"error": "Sorry, I'm having trouble connecting to my brain right now. Please try again in a moment."}), 500
\ No newline at end of file
+        return jsonify({"error": "Sorry, I'm having trouble connecting to my brain right now. Please try again in a moment."}), 500
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_completion(client, deployment, messages, **kwargs):
+    """
+    Streams one completion. Yields ('token', text) for content deltas and, at the
+    end, ('message', assistant_dict) with the full content and any tool calls.
+    """
+    content_parts = []
+    tool_calls = {}
+    with track_llm():
+        stream = client.chat.completions.create(model=deployment, messages=messages, stream=True, **kwargs)
+        for chunk in stream:
+            if not chunk.choices:
+                continue  # e.g. Azure content filter results
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content_parts.append(delta.content)
+                yield 'token', delta.content
+            for tc in delta.tool_calls or []:
+                call = tool_calls.setdefault(tc.index, {"id": None, "type": "function", "function": {"name": "", "arguments": ""}})
+                if tc.id:
+                    call["id"] = tc.id
+                if tc.function and tc.function.name:
+                    call["function"]["name"] += tc.function.name
+                if tc.function and tc.function.arguments:
+                    call["function"]["arguments"] += tc.function.arguments
+
+    message = {"role": "assistant", "content": "".join(content_parts) or None}
+    if tool_calls:
+        message["tool_calls"] = [tool_calls[i] for i in sorted(tool_calls)]
+    yield 'message', message
+
+@employee_bp.route('/chat/stream', methods=['POST'])
+@login_required
+@employee_required
+def chat_stream():
+    """
+    Streaming variant of /chat. Replies as server-sent events:
+    'token' ({"text"}) for each piece of the answer, 'tool' ({"name"}) when a
+    tool starts running, then 'done' or 'error'.
+    """
+    messages = start_conversation_turn()
+    if messages is None:
+        return jsonify({"error": "Empty message"}), 400
+
+    def generate():
+        try:
+            client = get_llm_client()
+            deployment = get_llm_deployment()
+
+            assistant_turn = None
+            for kind, value in stream_completion(client, deployment, messages, max_tokens=800, temperature=0.7,
+                                                 tools=tools, tool_choice="auto", top_p=0.95):
+                if kind == 'token':
+                    yield sse_event('token', {"text": value})
+                else:
+                    assistant_turn = value
+            messages.append(assistant_turn)
+
+            if assistant_turn.get("tool_calls"):
+                for tool_call in assistant_turn["tool_calls"]:
+                    yield sse_event('tool', {"name": tool_call["function"]["name"]})
+                run_tool_calls(assistant_turn["tool_calls"], messages)
+
+                final_turn = None
+                for kind, value in stream_completion(client, deployment, messages, max_tokens=800, temperature=0.7):
+                    if kind == 'token':
+                        yield sse_event('token', {"text": value})
+                    else:
+                        final_turn = value
+                messages.append({"role": "assistant", "content": final_turn["content"]})
+
+            save_history(messages)
+            yield sse_event('done', {})
+        except Exception as e:
+            print(f"Error in /chat/stream route: {e}")
+            yield sse_event('error', {"error": "Sorry, I'm having trouble connecting to my brain right now. Please try again in a moment."})
+
+    try:
+        events = get_chat_pool().stream(generate)
+    except ChatPoolSaturated:
+        return chat_busy_response()
+
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -1,39 +1,56 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response
-from models import Leave, LeaveStatus, Holiday
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context
+from models import Leave, LeaveStatus, Holiday, User
 from extensions import db
-from utils import manager_required, get_team_leave_summary, generate_dashboard_greeting
+import ledger
+import org_hierarchy
+from utils import manager_required, get_team_leave_summary, generate_dashboard_greeting, invalidate_team_summary, managed_employee_ids_subquery
 from flask_login import login_required, current_user
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.orm import aliased, joinedload
 import datetime
 import csv
 from io import StringIO
 from forms import RejectLeaveForm
+from calendar_feed import calendar_feed_response, parse_calendar_range
+from leave_duration import working_days, working_days_bulk
+from absence_heatmap import absence_heatmap, parse_heatmap_args
 
 manager_bp = Blueprint('manager', __name__, url_prefix='/manager')
 
+def _requested_scope():
+    """'subtree' (everyone below the manager) if ?scope=subtree was asked for, else 'team' (direct reports)."""
+    return 'subtree' if request.args.get('scope') == 'subtree' else 'team'
+
 @manager_bp.route('/dashboard')
 @login_required
 @manager_required
 def dashboard():
     # Only show leaves of employees managed by this manager
-    managed_employee_ids = [emp.id for emp in current_user.managed_employees.all()]
-    
-    pending_leaves = Leave.query.filter(
+    managed_employee_ids = managed_employee_ids_subquery(current_user.id)
+
+    pending_leaves = Leave.query.options(joinedload(Leave.employee)).filter(
         Leave.user_id.in_(managed_employee_ids),
         Leave.status == LeaveStatus.PENDING
     ).order_by(Leave.applied_at.asc()).all()
 
-    recent_approved_rejected_leaves = Leave.query.filter(
+    recent_approved_rejected_leaves = Leave.query.options(
+        joinedload(Leave.employee), joinedload(Leave.approver)
+    ).filter(
         Leave.user_id.in_(managed_employee_ids),
         Leave.status.in_([LeaveStatus.APPROVED, LeaveStatus.REJECTED])
     ).order_by(Leave.approved_at.desc()).limit(10).all()
 
-    team_summary = get_team_leave_summary(current_user)
+    # Summary, calendar and report can cover the whole subtree; approvals stay with the direct manager
+    scope = _requested_scope()
+    team_summary = get_team_leave_summary(current_user, subtree=scope == 'subtree')
     greeting_data = generate_dashboard_greeting(current_user)
 
     return render_template('manager/dashboard.html', 
                            pending_leaves=pending_leaves, 
                            recent_leaves=recent_approved_rejected_leaves,
                            team_summary=team_summary,
+                           scope=scope,
+                           has_subtree=org_hierarchy.has_subtree(current_user.id),
                            greeting_data=greeting_data,
                            LeaveStatus=LeaveStatus,
                            title='Manager Dashboard')
@@ -48,10 +65,13 @@ def approve_leave(leave_id):
         flash('You are not authorized to approve this leave.', 'danger')
         return redirect(url_for('manager.dashboard'))
 
+    old_status = leave.status
     leave.status = LeaveStatus.APPROVED
     leave.approved_by_id = current_user.id
     leave.approved_at = datetime.datetime.utcnow()
+    ledger.record_status_change(leave, old_status)
     db.session.commit()
+    invalidate_team_summary(current_user.id)
     flash(f'Leave for {leave.employee.name} approved.', 'success')
     return redirect(url_for('manager.dashboard'))
 
@@ -67,39 +87,117 @@ def reject_leave(leave_id):
 
     form = RejectLeaveForm()
     if form.validate_on_submit():
+        old_status = leave.status
         leave.status = LeaveStatus.REJECTED
         leave.approved_by_id = current_user.id # Still marks who took action
         leave.approved_at = datetime.datetime.utcnow() # Time of action
         leave.rejection_reason = form.rejection_reason.data
+        ledger.record_status_change(leave, old_status)
         db.session.commit()
+        invalidate_team_summary(current_user.id)
         flash(f'Leave for {leave.employee.name} rejected.', 'success')
         return redirect(url_for('manager.dashboard'))
     
     return render_template('manager/review_leaves.html', leave=leave, form=form, title='Reject Leave')
 
 
+BULK_REVIEW_MAX_IDS = 500
+
+@manager_bp.route('/leaves/bulk', methods=['POST'])
+@login_required
+@manager_required
+def bulk_review_leaves():
+    """
+    Approves or rejects many pending leaves in one transaction.
+
+    JSON body: {"action": "approve" | "reject", "leave_ids": [...],
+    "rejection_reason": "..."} (the reason is required to reject). The
+    response has one result per requested id: "approved"/"rejected", or
+    "not_found", "not_authorized" or "not_pending" when that id was skipped.
+    """
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action not in ('approve', 'reject'):
+        return jsonify({"error": "action must be 'approve' or 'reject'."}), 400
+    try:
+        leave_ids = list(dict.fromkeys(int(i) for i in data.get('leave_ids') or []))
+    except (TypeError, ValueError):
+        return jsonify({"error": "leave_ids must be a list of integers."}), 400
+    if not leave_ids:
+        return jsonify({"error": "No leaves selected."}), 400
+    if len(leave_ids) > BULK_REVIEW_MAX_IDS:
+        return jsonify({"error": f"At most {BULK_REVIEW_MAX_IDS} leaves can be reviewed at once."}), 400
+
+    rejection_reason = (data.get('rejection_reason') or '').strip()
+    if action == 'reject' and not 10 <= len(rejection_reason) <= 500:
+        return jsonify({"error": "A rejection reason of 10 to 500 characters is required."}), 400
+    new_status = LeaveStatus.APPROVED if action == 'approve' else LeaveStatus.REJECTED
+
+    # One set-based authority check: the leaves plus their owners' manager, locked for the update
+    rows = db.session.query(
+        Leave.id, Leave.user_id, Leave.leave_type, Leave.start_date, Leave.end_date, Leave.status, User.manager_id
+    ).join(User, User.id == Leave.user_id).filter(Leave.id.in_(leave_ids)).with_for_update(of=Leave).all()
+    found = {row.id: row for row in rows}
+
+    results = {}
+    eligible = []
+    for leave_id in leave_ids:
+        row = found.get(leave_id)
+        if row is None:
+            results[leave_id] = 'not_found'
+        elif row.manager_id != current_user.id:
+            results[leave_id] = 'not_authorized'
+        elif row.status != LeaveStatus.PENDING:
+            results[leave_id] = 'not_pending'
+        else:
+            eligible.append(row)
+
+    if eligible:
+        values = {
+            'status': new_status,
+            'approved_by_id': current_user.id, # Also marks who rejected
+            'approved_at': datetime.datetime.utcnow(),
+        }
+        if new_status == LeaveStatus.REJECTED:
+            values['rejection_reason'] = rejection_reason
+        # FOR UPDATE is a no-op on SQLite, so a concurrent review may have decided some of them since;
+        # only the rows this UPDATE actually changed move ledger days
+        updated_ids = set(db.session.scalars(
+            update(Leave)
+            .where(Leave.id.in_([row.id for row in eligible]), Leave.status == LeaveStatus.PENDING)
+            .values(**values)
+            .returning(Leave.id)
+            .execution_options(synchronize_session=False)
+        ).all())
+        for row in eligible:
+            if row.id not in updated_ids:
+                results[row.id] = 'not_pending'
+        eligible = [row for row in eligible if row.id in updated_ids]
+        ledger.record_bulk_status_change(eligible, LeaveStatus.PENDING, new_status)
+        db.session.commit()
+        invalidate_team_summary(current_user.id)
+        for row in eligible:
+            results[row.id] = new_status.value.lower()
+
+    return jsonify({
+        "action": action,
+        "updated": len(eligible),
+        "results": [{"id": leave_id, "result": results[leave_id]} for leave_id in leave_ids],
+    })
+
 @manager_bp.route('/get_team_leaves_for_calendar')
 @login_required
 @manager_required
 def get_team_leaves_for_calendar():
-    start_str = request.args.get('start')
-    end_str = request.args.get('end')
+    start_date, end_date = parse_calendar_range(request.args)
 
-    start_date = datetime.datetime.fromisoformat(start_str.replace('Z', '+00:00')).date() if start_str else None
-    end_date = datetime.datetime.fromisoformat(end_str.replace('Z', '+00:00')).date() if end_str else None
+    # Leaves of the employees managed by CURRENT_USER, or of everyone below them with ?scope=subtree
+    if _requested_scope() == 'subtree':
+        user_ids, scope = managed_employee_ids_subquery(current_user.id, subtree=True), f'subtree:{current_user.id}'
+    else:
+        user_ids, scope = db.session.scalars(managed_employee_ids_subquery(current_user.id)).all(), None
 
-    # Get leaves for employees managed by CURRENT_USER
-    managed_employee_ids = [emp.id for emp in current_user.managed_employees.all()]
-    
-    team_leaves_query = Leave.query.filter(Leave.user_id.in_(managed_employee_ids))
-    if start_date and end_date:
-        team_leaves_query = team_leaves_query.filter(Leave.start_date <= end_date, Leave.end_date >= start_date)
-    team_leaves = team_leaves_query.all()
-    
-    holidays = Holiday.query.all() # Fetch all holidays
-
-    events = []
-    for leave in team_leaves:
+    def leave_event(leave):
         color = ''
         if leave.status == LeaveStatus.APPROVED:
             color = 'green'
@@ -107,8 +205,9 @@ def get_team_leaves_for_calendar():
             color = 'orange'
         elif leave.status == LeaveStatus.REJECTED:
             color = 'red'
-        
-        events.append({
+
+        return {
+            'id': leave.id,
             'title': f'{leave.employee.name} - {leave.leave_type.value} ({leave.status.value})',
             'start': leave.start_date.isoformat(),
             'end': (leave.end_date + datetime.timedelta(days=1)).isoformat(), # FullCalendar end date is exclusive
@@ -122,35 +221,25 @@ def get_team_leaves_for_calendar():
                 'leave_id': leave.id,
                 'user_id': leave.user_id,
             }
-        })
-
-    # Query for holidays and critical days separately
-    holidays = Holiday.query.filter_by(is_critical=False).all()
-    critical_days = Holiday.query.filter_by(is_critical=True).all()
-
-    # Loop for HOLIDAYS (days off)
-    for holiday in holidays:
-        events.append({
-            'title': f'{holiday.name} (Holiday)',
-            'start': holiday.date.isoformat(),
-            'end': (holiday.date + datetime.timedelta(days=1)).isoformat(),
-            'backgroundColor': '#ced4da', # A neutral grey for days off
-            'borderColor': '#ced4da',
-            'display': 'background',
-        })
-
-    # Loop for CRITICAL DAYS (no leave allowed)
-    for day in critical_days:
-        events.append({
-            'title': f'{day.name} (Critical Day)',
-            'start': day.date.isoformat(),
-            'end': (day.date + datetime.timedelta(days=1)).isoformat(),
-            'backgroundColor': '#f8d7da', # A light, cautionary red
-            'borderColor': '#f8d7da',
-            'display': 'background',
-        })
-
-    return jsonify(events)
+        }
+
+    return calendar_feed_response(user_ids, start_date, end_date, leave_event, scope=scope)
+
+@manager_bp.route('/absence_heatmap')
+@login_required
+@manager_required
+def team_absence_heatmap():
+    """
+    Daily absence counts for the manager's team; see absence_heatmap.py.
+    Query parameters: start, end (YYYY-MM-DD), status (e.g. APPROVED,PENDING),
+    scope ('team' or 'subtree').
+    """
+    try:
+        start_date, end_date, statuses = parse_heatmap_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    user_ids = managed_employee_ids_subquery(current_user.id, subtree=_requested_scope() == 'subtree')
+    return jsonify(absence_heatmap(start_date, end_date, statuses, user_ids))
 
 @manager_bp.route('/export_team_leaves')
 @login_required
@@ -164,6 +253,7 @@ def export_team_leaves():
     - end_date: YYYY-MM-DD (for custom filter)
     - status: 'all', 'PENDING', 'APPROVED', 'REJECTED'
     - format: 'html' (default) or 'csv' (for download)
+    - scope: 'team' (default, direct reports) or 'subtree' (everyone below the manager)
     """
     try:
         # Get filter parameters
@@ -173,17 +263,16 @@ def export_team_leaves():
         custom_end = request.args.get('end_date')
         export_format = request.args.get('format', 'html')
         
-        # Get managed employees
-        managed_employee_ids = [emp.id for emp in current_user.managed_employees.all()]
+        scope = _requested_scope()
         
-        # Base query
-        query = Leave.query.filter(Leave.user_id.in_(managed_employee_ids))
+        # Filters shared by the HTML report and the CSV export: leaves of managed employees
+        conditions = [Leave.user_id.in_(managed_employee_ids_subquery(current_user.id, subtree=scope == 'subtree'))]
         
         # Apply status filter
         if status_filter and status_filter != 'all':
             try:
                 status_enum = LeaveStatus[status_filter]
-                query = query.filter(Leave.status == status_enum)
+                conditions.append(Leave.status == status_enum)
             except KeyError:
                 pass
         
@@ -224,78 +313,226 @@ def export_team_leaves():
         
         # Apply date range filter if specified
         if start_date and end_date:
-            query = query.filter(Leave.start_date <= end_date, Leave.end_date >= start_date)
-        
-        # Order by date
-        leaves = query.order_by(Leave.start_date.desc()).all()
+            conditions.extend([Leave.start_date <= end_date, Leave.end_date >= start_date])
         
-        # If CSV format is requested, generate CSV download
+        # If CSV format is requested, stream the CSV download
         if export_format == 'csv':
-            output = StringIO()
-            writer = csv.writer(output)
-            
-            # Write header
-            writer.writerow([
-                'Employee Name',
-                'Employee Email',
-                'Leave Type',
-                'Start Date',
-                'End Date',
-                'Days',
-                'Status',
-                'Reason',
-                'Applied At',
-                'Approved/Rejected By',
-                'Approved/Rejected At',
-                'Rejection Reason',
-                'Document Attached'
-            ])
-            
-            # Write data rows
-            for leave in leaves:
-                days = (leave.end_date - leave.start_date).days + 1
-                approver_name = leave.approver.name if leave.approver else 'N/A'
-                applied_at = leave.applied_at.strftime('%Y-%m-%d %H:%M') if leave.applied_at else 'N/A'
-                approved_at = leave.approved_at.strftime('%Y-%m-%d %H:%M') if leave.approved_at else 'N/A'
-                
-                writer.writerow([
-                    leave.employee.name,
-                    leave.employee.email,
-                    leave.leave_type.value,
-                    leave.start_date.strftime('%Y-%m-%d'),
-                    leave.end_date.strftime('%Y-%m-%d'),
-                    days,
-                    leave.status.value,
-                    leave.reason or 'N/A',
-                    applied_at,
-                    approver_name,
-                    approved_at,
-                    leave.rejection_reason or 'N/A',
-                    'Yes' if leave.document_path else 'No'
-                ])
-            
-            output.seek(0)
             filename = f"team_leaves_{current_user.name.replace(' ', '_')}_{filter_type}"
             if start_date and end_date:
                 filename += f"_{start_date}_{end_date}"
             filename += f"_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
             
             return Response(
-                output.getvalue(),
+                stream_with_context(_team_leaves_csv(conditions)),
                 mimetype='text/csv',
                 headers={'Content-Disposition': f'attachment; filename={filename}'}
             )
         
-        # Otherwise, render HTML page
+        # Otherwise, render one keyset page of the HTML report; details are fetched on demand
+        order = 'asc' if request.args.get('order') == 'asc' else 'desc'
+        per_page = min(max(request.args.get('per_page', REPORT_PAGE_SIZE, type=int), 1), REPORT_MAX_PAGE_SIZE)
+        total_records = db.session.query(func.count(Leave.id)).filter(*conditions).scalar()
+        query = Leave.query.options(
+            joinedload(Leave.employee), joinedload(Leave.approver)
+        ).filter(*conditions)
+        leaves, prev_cursor, next_cursor = _keyset_page(
+            query, order, per_page,
+            after=request.args.get('after'), before=request.args.get('before'),
+        )
+        # Working days for the whole page in one vectorized count
+        leave_days = dict(zip(
+            [leave.id for leave in leaves],
+            working_days_bulk([leave.start_date for leave in leaves], [leave.end_date for leave in leaves]).tolist(),
+        ))
+        
         return render_template('manager/team_leaves_report.html',
                              leaves=leaves,
+                             leave_days=leave_days,
+                             total_records=total_records,
+                             order=order,
+                             per_page=per_page,
+                             prev_cursor=prev_cursor,
+                             next_cursor=next_cursor,
                              filter_type=filter_type,
                              filter_description=filter_description,
                              status_filter=status_filter,
+                             scope=scope,
                              start_date=start_date,
                              end_date=end_date,
                              LeaveStatus=LeaveStatus,
                              title='Team Leaves Report')
     except Exception as e:
         flash(f'Error generating report: {str(e)}', 'danger')
-        return redirect(url_for('manager.dashboard'))
\ No newline at end of file
+        return redirect(url_for('manager.dashboard'))
+
+
+REPORT_PAGE_SIZE = 50
+REPORT_MAX_PAGE_SIZE = 200
+
+def _encode_report_cursor(leave):
+    return f"{leave.start_date.isoformat()}_{leave.id}"
+
+def _decode_report_cursor(cursor):
+    try:
+        start, leave_id = cursor.split('_', 1)
+        return datetime.date.fromisoformat(start), int(leave_id)
+    except (AttributeError, ValueError):
+        return None
+
+def _keyset_page(query, order, per_page, after=None, before=None):
+    """
+    Returns (leaves, prev_cursor, next_cursor) for one page of query sorted by
+    (start_date, id) in the given order. 'after' continues past a cursor,
+    'before' walks back from one; both are cursors produced by this function.
+    """
+    descending = order == 'desc'
+    after_key = _decode_report_cursor(after) if after else None
+    before_key = _decode_report_cursor(before) if before and not after_key else None
+
+    def past(key, forward):
+        start, leave_id = key
+        # 'forward' means further along the requested sort order
+        if forward == descending:
+            return or_(Leave.start_date < start, and_(Leave.start_date == start, Leave.id < leave_id))
+        return or_(Leave.start_date > start, and_(Leave.start_date == start, Leave.id > leave_id))
+
+    def ordered(forward):
+        if forward == descending:
+            return query.order_by(Leave.start_date.desc(), Leave.id.desc())
+        return query.order_by(Leave.start_date.asc(), Leave.id.asc())
+
+    if before_key:
+        rows = ordered(False).filter(past(before_key, False)).limit(per_page + 1).all()
+        has_prev, has_next = len(rows) > per_page, True
+        leaves = list(reversed(rows[:per_page]))
+    else:
+        page_query = ordered(True)
+        if after_key:
+            page_query = page_query.filter(past(after_key, True))
+        rows = page_query.limit(per_page + 1).all()
+        has_prev, has_next = after_key is not None, len(rows) > per_page
+        leaves = rows[:per_page]
+
+    prev_cursor = _encode_report_cursor(leaves[0]) if leaves and has_prev else None
+    next_cursor = _encode_report_cursor(leaves[-1]) if leaves and has_next else None
+    return leaves, prev_cursor, next_cursor
+
+
+@manager_bp.route('/leaves/<int:leave_id>/detail')
+@login_required
+@manager_required
+def leave_detail(leave_id):
+    """JSON details of one team leave, loaded lazily by the report's detail modal."""
+    leave = Leave.query.options(joinedload(Leave.employee), joinedload(Leave.approver)).get_or_404(leave_id)
+    if leave.employee.manager_id != current_user.id and current_user.id not in org_hierarchy.ancestor_ids([leave.user_id]):
+        return jsonify({"error": "You are not authorized to view this leave."}), 403
+
+    return jsonify({
+        'id': leave.id,
+        'employee_name': leave.employee.name,
+        'employee_email': leave.employee.email,
+        'leave_type': leave.leave_type.value,
+        'start_date': leave.start_date.strftime('%B %d, %Y'),
+        'end_date': leave.end_date.strftime('%B %d, %Y'),
+        'days': working_days(leave.start_date, leave.end_date),
+        'status': leave.status.value,
+        'reason': leave.reason,
+        'applied_at': leave.applied_at.strftime('%B %d, %Y %I:%M %p') if leave.applied_at else None,
+        'approver_name': leave.approver.name if leave.approver else None,
+        'approved_at': leave.approved_at.strftime('%B %d, %Y %I:%M %p') if leave.approved_at else None,
+        'rejection_reason': leave.rejection_reason,
+        'document_url': url_for('static', filename='uploads/' + leave.document_path) if leave.document_path else None,
+    })
+
+
+CSV_EXPORT_PAGE_SIZE = 1000
+
+def _team_leaves_csv(conditions):
+    """
+    Yields the team leaves CSV in chunks, one keyset page at a time, so memory
+    stays flat regardless of how many rows match. Only the exported columns are
+    selected; no Leave/User objects are built.
+    """
+    approver = aliased(User)
+    columns = (
+        Leave.id,
+        User.name,
+        User.email,
+        Leave.leave_type,
+        Leave.start_date,
+        Leave.end_date,
+        Leave.status,
+        Leave.reason,
+        Leave.applied_at,
+        approver.name,
+        Leave.approved_at,
+        Leave.rejection_reason,
+        Leave.document_path,
+    )
+
+    output = StringIO()
+    writer = csv.writer(output)
+
+    def flush():
+        chunk = output.getvalue()
+        output.seek(0)
+        output.truncate(0)
+        return chunk
+
+    # Write header
+    writer.writerow([
+        'Employee Name',
+        'Employee Email',
+        'Leave Type',
+        'Start Date',
+        'End Date',
+        'Days',
+        'Status',
+        'Reason',
+        'Applied At',
+        'Approved/Rejected By',
+        'Approved/Rejected At',
+        'Rejection Reason',
+        'Document Attached'
+    ])
+    yield flush()
+
+    last_key = None
+    while True:
+        page_query = db.session.query(*columns).join(
+            User, User.id == Leave.user_id
+        ).outerjoin(
+            approver, approver.id == Leave.approved_by_id
+        ).filter(*conditions)
+        if last_key is not None:
+            last_start, last_id = last_key
+            page_query = page_query.filter(or_(
+                Leave.start_date < last_start,
+                and_(Leave.start_date == last_start, Leave.id < last_id),
+            ))
+        rows = page_query.order_by(Leave.start_date.desc(), Leave.id.desc()).limit(CSV_EXPORT_PAGE_SIZE).all()
+        if not rows:
+            break
+
+        # Write data rows; the page's working days are counted in one call
+        page_days = working_days_bulk([row.start_date for row in rows], [row.end_date for row in rows]).tolist()
+        for (leave_id, employee_name, employee_email, leave_type, start_date, end_date, status, reason,
+             applied_at, approver_name, approved_at, rejection_reason, document_path), days in zip(rows, page_days):
+            writer.writerow([
+                employee_name,
+                employee_email,
+                leave_type.value,
+                start_date.strftime('%Y-%m-%d'),
+                end_date.strftime('%Y-%m-%d'),
+                days,
+                status.value,
+                reason or 'N/A',
+                applied_at.strftime('%Y-%m-%d %H:%M') if applied_at else 'N/A',
+                approver_name or 'N/A',
+                approved_at.strftime('%Y-%m-%d %H:%M') if approved_at else 'N/A',
+                rejection_reason or 'N/A',
+                'Yes' if document_path else 'No'
+            ])
+        yield flush()
+
+        last_key = (rows[-1].start_date, rows[-1].id)
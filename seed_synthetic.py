@@ -0,0 +1,183 @@
+"""
+Synthetic organisation generator for local load testing.
+
+Builds a configurable org (default: 20k users in a 4-level manager tree,
+2M leaves spread over 10 years, and a holiday calendar) using bulk inserts,
+then rebuilds the leave balance ledger and the org closure table.
+
+Run it through the CLI:
+    flask db-seed-synthetic --users 20000 --leaves 2000000 --years 10
+
+Every synthetic account uses the password 'password' and an
+@synthetic.example email address:
+- admin@synthetic.example            admin
+- l1-*, l2-*, l3-*@synthetic.example managers (top to bottom of the tree)
+- l4-*@synthetic.example             employees
+"""
+import datetime
+import random
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from extensions import db, cache
+from models import User, UserRole, Leave, LeaveType, LeaveStatus, Holiday
+from utils import bump_data_version
+import ledger
+import org_hierarchy
+
+EMAIL_DOMAIN = 'synthetic.example'
+SYNTHETIC_PASSWORD = 'password'
+
+# Share of the org at each level of the tree, top to bottom; the rest are employees
+LEVEL_SHARES = (0.0015, 0.01, 0.07)
+
+LEAVE_TYPE_WEIGHTS = [
+    (LeaveType.VACATION, 70),
+    (LeaveType.SICK, 22),
+    (LeaveType.BEREAVEMENT, 3),
+    (LeaveType.UNPAID, 5),
+]
+# Duration in days and its weight
+DURATION_WEIGHTS = [(1, 45), (2, 20), (3, 12), (4, 8), (5, 10), (10, 5)]
+
+
+def _level_sizes(total_users):
+    sizes = [max(1, int(total_users * share)) for share in LEVEL_SHARES]
+    sizes.append(max(1, total_users - sum(sizes)))
+    return sizes
+
+
+def _insert_level(level, count, parent_ids, password_hash, rng, batch_size):
+    """Inserts one level of the tree and returns the new ids in insertion order."""
+    role = UserRole.EMPLOYEE if level == 4 else UserRole.MANAGER
+    rows = []
+    for i in range(count):
+        rows.append({
+            'name': f'Synthetic L{level} User {i + 1}',
+            'email': f'l{level}-{i + 1}@{EMAIL_DOMAIN}',
+            'password_hash': password_hash,
+            'role': role,
+            'manager_id': rng.choice(parent_ids) if parent_ids else None,
+            'force_password_change': False,
+        })
+        if len(rows) >= batch_size:
+            db.session.execute(insert(User), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(User), rows)
+
+    return [user_id for (user_id,) in db.session.query(User.id).filter(
+        User.email.like(f'l{level}-%@{EMAIL_DOMAIN}')
+    ).order_by(User.id).all()]
+
+
+def _holiday_rows(first_year, last_year, rng):
+    rows = []
+    for year in range(first_year, last_year + 1):
+        fixed = [(1, 1, "New Year's Day"), (4, 9, 'Day of Valor'), (5, 1, 'Labor Day'),
+                 (6, 12, 'Independence Day'), (8, 21, 'Ninoy Aquino Day'), (11, 1, "All Saints' Day"),
+                 (11, 30, 'Bonifacio Day'), (12, 8, 'Feast of the Immaculate Conception'),
+                 (12, 25, 'Christmas Day'), (12, 30, 'Rizal Day'), (12, 31, "New Year's Eve")]
+        for month, day, name in fixed:
+            rows.append({'date': datetime.date(year, month, day), 'name': name, 'is_critical': False})
+        # A few critical days (quarter closes) where no leave is allowed
+        for month in (3, 6, 9):
+            day = datetime.date(year, month, 28)
+            if day.weekday() >= 5:
+                day -= datetime.timedelta(days=day.weekday() - 4)
+            rows.append({'date': day, 'name': f'Q{month // 3} Close', 'is_critical': True})
+        # Plus a couple of movable holidays
+        for name in ('Company Foundation Day', 'Team Building Day'):
+            candidate = datetime.date(year, rng.randint(2, 10), rng.randint(1, 27))
+            if all(row['date'] != candidate for row in rows):
+                rows.append({'date': candidate, 'name': name, 'is_critical': False})
+    return rows
+
+
+def generate_org(users=20000, leaves=2000000, years=10, seed=42, batch_size=10000, log=print):
+    """Creates the synthetic org. Returns a dict with the number of rows created per table."""
+    if User.query.filter(User.email.like(f'%@{EMAIL_DOMAIN}')).first():
+        raise ValueError('Synthetic data already exists; reset the database before generating again.')
+
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(SYNTHETIC_PASSWORD)  # hashed once, shared by every account
+
+    admin = User(name='Synthetic Admin', email=f'admin@{EMAIL_DOMAIN}', role=UserRole.ADMIN,
+                 password_hash=password_hash, force_password_change=False)
+    db.session.add(admin)
+
+    level_ids = []
+    for level, size in enumerate(_level_sizes(users), start=1):
+        parent_ids = level_ids[-1] if level_ids else None
+        level_ids.append(_insert_level(level, size, parent_ids, password_hash, rng, batch_size))
+        log(f'Level {level}: {size} users')
+
+    # Manager lookup for approvals, without loading User objects
+    manager_of = dict(db.session.query(User.id, User.manager_id).filter(User.email.like(f'%@{EMAIL_DOMAIN}')).all())
+    leave_takers = [user_id for ids in level_ids[1:] for user_id in ids]  # everyone with a manager
+
+    today = datetime.date.today()
+    first_day = datetime.date(today.year - years + 1, 1, 1)
+    last_day = datetime.date(today.year, 12, 31)
+    span = (last_day - first_day).days
+
+    holidays = _holiday_rows(first_day.year, last_day.year, rng)
+    existing_holiday_dates = {d for (d,) in db.session.query(Holiday.date).all()}
+    holidays = [row for row in holidays if row['date'] not in existing_holiday_dates]
+    db.session.execute(insert(Holiday), holidays)
+    log(f'Holidays: {len(holidays)}')
+
+    leave_types = [t for t, _ in LEAVE_TYPE_WEIGHTS]
+    type_weights = [w for _, w in LEAVE_TYPE_WEIGHTS]
+    durations = [d for d, _ in DURATION_WEIGHTS]
+    duration_weights = [w for _, w in DURATION_WEIGHTS]
+
+    rows = []
+    for i in range(leaves):
+        user_id = rng.choice(leave_takers)
+        start_date = first_day + datetime.timedelta(days=rng.randrange(span))
+        end_date = min(start_date + datetime.timedelta(days=rng.choices(durations, duration_weights)[0] - 1), last_day)
+        applied_at = datetime.datetime.combine(start_date - datetime.timedelta(days=rng.randint(1, 30)),
+                                               datetime.time(rng.randint(8, 18), rng.randint(0, 59)))
+        roll = rng.random()
+        if start_date > today and roll < 0.6:
+            status, approved_by_id, approved_at = LeaveStatus.PENDING, None, None
+        else:
+            status = LeaveStatus.REJECTED if roll > 0.92 else LeaveStatus.APPROVED
+            approved_by_id = manager_of.get(user_id)
+            approved_at = applied_at + datetime.timedelta(hours=rng.randint(1, 72))
+
+        rows.append({
+            'user_id': user_id,
+            'leave_type': rng.choices(leave_types, type_weights)[0],
+            'start_date': start_date,
+            'end_date': end_date,
+            'status': status,
+            'reason': 'Synthetic leave generated for load testing',
+            'applied_at': applied_at,
+            'approved_by_id': approved_by_id,
+            'approved_at': approved_at,
+            'rejection_reason': 'Team coverage' if status == LeaveStatus.REJECTED else None,
+            'updated_at': approved_at or applied_at,
+        })
+        if len(rows) >= batch_size:
+            db.session.execute(insert(Leave), rows)
+            rows = []
+            if (i + 1) % (batch_size * 20) == 0:
+                log(f'Leaves: {i + 1}/{leaves}')
+    if rows:
+        db.session.execute(insert(Leave), rows)
+    log(f'Leaves: {leaves}/{leaves}')
+
+    balance_rows = ledger.rebuild_ledger()
+    org_hierarchy.rebuild_closure()
+    bump_data_version('holidays')
+    bump_data_version('users')
+    db.session.commit()
+    cache.clear()
+
+    return {
+        'users': 1 + sum(len(ids) for ids in level_ids),
+        'holidays': len(holidays),
+        'leaves': leaves,
+        'leave_balances': balance_rows,
+    }
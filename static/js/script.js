@@ -8,4 +8,43 @@ document.addEventListener('DOMContentLoaded', function () {
     var tooltipList = tooltipTriggerList.map(function (tooltipTriggerEl) {
         return new bootstrap.Tooltip(tooltipTriggerEl);
     });
-});
\ No newline at end of file
+});
+
+// FullCalendar event source backed by the delta-sync calendar feeds.
+// Keeps the events of each visible window in memory and only asks the server
+// for what changed since the last cursor; unchanged windows come back as 304
+// and are served from the browser cache.
+function deltaEventSource(url) {
+    var windows = {};
+
+    return function (info, successCallback, failureCallback) {
+        var key = info.startStr + '|' + info.endStr;
+        var state = windows[key] || { cursor: '', leaves: new Map(), holidays: [] };
+        var params = new URLSearchParams({ start: info.startStr, end: info.endStr, delta: '1' });
+        if (state.cursor) {
+            params.append('cursor', state.cursor);
+        }
+
+        fetch(url + (url.includes('?') ? '&' : '?') + params.toString(), { credentials: 'same-origin' })
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error('Calendar feed returned ' + response.status);
+                }
+                return response.json();
+            })
+            .then(function (data) {
+                if (data.reset) {
+                    state.leaves = new Map();
+                }
+                data.deleted.forEach(function (id) { state.leaves.delete(id); });
+                data.events.forEach(function (event) { state.leaves.set(event.id, event); });
+                if (data.holidays !== null) {
+                    state.holidays = data.holidays;
+                }
+                state.cursor = data.cursor;
+                windows[key] = state;
+                successCallback(Array.from(state.leaves.values()).concat(state.holidays));
+            })
+            .catch(failureCallback);
+    };
+}
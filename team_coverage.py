@@ -0,0 +1,168 @@
+"""
+Team coverage check for leave applications.
+
+A team is the direct reports of one manager. For each team we keep a sweep
+index of its approved and pending leaves that end today or later:
+
+- `boundaries`: the sorted days on which the number of people out changes
+  (every leave's first day and the day after its last, after merging each
+  person's overlapping leaves so nobody is counted twice);
+- `counts[i]`: people out on every day of [boundaries[i], boundaries[i+1]);
+- a sparse table over `counts`, so the maximum over any run of segments is
+  the larger of two precomputed block maxima.
+
+"Most people out at once in [start, end]" is then two binary searches and
+two lookups, however many years of leaves the team has. Past leaves never
+enter the index, so its size only depends on upcoming leave.
+
+Indexes are kept in the cache as plain lists (the sparse table is rebuilt
+on load), keyed by a fingerprint of the team's upcoming leaves (count and
+latest updated_at, one aggregate query) plus the users version and today's
+date, so any leave change, status change or team change builds a fresh one
+on the next check.
+"""
+import datetime
+import hashlib
+from collections import namedtuple
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+from extensions import db, cache
+from models import Leave, LeaveStatus, User
+from utils import get_data_version, managed_employee_ids_subquery
+from calendar_feed import USERS_VERSION_KEY
+
+COVERAGE_CACHE_TTL = 3600  # seconds; entries also retire as soon as their fingerprint changes
+ACTIVE_STATUSES = (LeaveStatus.APPROVED, LeaveStatus.PENDING)
+
+CoverageResult = namedtuple('CoverageResult', 'absent allowed team_size')
+
+
+class TeamCoverage:
+    def __init__(self, team_size, boundaries, counts):
+        """`boundaries`: date ordinals where the count changes; `counts[i]`: people out from boundaries[i]."""
+        self.team_size = team_size
+        self.boundaries = np.asarray(boundaries, dtype=np.int64)
+        counts = np.asarray(counts, dtype=np.int64)
+
+        # levels[k][i] = max(counts[i : i + 2**k])
+        self.levels = [counts]
+        width = 1
+        while 2 * width <= len(counts):
+            previous = self.levels[-1]
+            self.levels.append(np.maximum(previous[:-width], previous[width:]))
+            width *= 2
+
+    @classmethod
+    def from_leaves(cls, team_size, starts, ends):
+        """`starts`/`ends`: date ordinals of each leave's first and last day (one person's leaves must not overlap)."""
+        starts = np.asarray(starts, dtype=np.int64)
+        stops = np.asarray(ends, dtype=np.int64) + 1  # the first day back
+        boundaries = np.unique(np.concatenate((starts, stops)))
+        change = np.zeros(len(boundaries), dtype=np.int64)
+        np.add.at(change, np.searchsorted(boundaries, starts), 1)
+        np.add.at(change, np.searchsorted(boundaries, stops), -1)
+        return cls(team_size, boundaries, np.cumsum(change))
+
+    def to_json(self):
+        """Plain ints for the cache (which only stores JSON); the sparse table is rebuilt on load."""
+        return {'team_size': self.team_size, 'boundaries': self.boundaries.tolist(), 'counts': self.levels[0].tolist()}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['team_size'], data['boundaries'], data['counts'])
+
+    def max_absent(self, start_date, end_date):
+        """Most team members on approved or pending leave on any one day of [start_date, end_date]."""
+        if len(self.boundaries) == 0:
+            return 0
+        first = int(np.searchsorted(self.boundaries, start_date.toordinal(), side='right')) - 1
+        last = int(np.searchsorted(self.boundaries, end_date.toordinal(), side='right')) - 1
+        if last < 0:
+            return 0  # The range ends before the first upcoming leave
+        first = max(first, 0)  # Days before the first boundary have nobody out
+        k = (last - first + 1).bit_length() - 1
+        level = self.levels[k]
+        return int(max(level[first], level[last - (1 << k) + 1]))
+
+
+def _team_leaves(manager_id, today):
+    return Leave.query.filter(
+        Leave.user_id.in_(managed_employee_ids_subquery(manager_id)),
+        Leave.status.in_(ACTIVE_STATUSES),
+        Leave.end_date >= today,
+    )
+
+
+def _merge_by_user(rows):
+    """
+    (starts, ends) with each user's overlapping or back-to-back leaves merged,
+    so the sweep counts people rather than leaves. rows: (user_id, start, end) ordinals.
+    """
+    starts, ends = [], []
+    previous_user_id = None
+    for user_id, start, end in sorted(rows):
+        if user_id == previous_user_id and start <= ends[-1] + 1:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+            previous_user_id = user_id
+    return starts, ends
+
+
+def get_team_coverage(manager_id, exclude_user_id=None):
+    """
+    Returns the TeamCoverage index of a manager's direct reports (leaving out
+    exclude_user_id's leaves), building it if it is stale.
+    """
+    today = datetime.date.today()
+    count, last_update = _team_leaves(manager_id, today).with_entities(
+        func.count(Leave.id), func.max(Leave.updated_at)
+    ).one()
+    fingerprint = hashlib.sha1(
+        f"{count}:{last_update}:{get_data_version(USERS_VERSION_KEY)}:{today}".encode('utf-8')
+    ).hexdigest()[:16]
+    key = f"coverage:{manager_id}:{exclude_user_id or 0}:{fingerprint}"
+    cached = cache.get(key)
+    if cached is not None:
+        return TeamCoverage.from_json(cached)
+
+    leaves = _team_leaves(manager_id, today)
+    if exclude_user_id is not None:
+        leaves = leaves.filter(Leave.user_id != exclude_user_id)
+    rows = leaves.with_entities(Leave.user_id, Leave.start_date, Leave.end_date).all()
+    team_size = db.session.query(func.count(User.id)).filter(User.manager_id == manager_id).scalar()
+    coverage = TeamCoverage.from_leaves(team_size, *_merge_by_user(
+        (user_id, max(start, today).toordinal(), end.toordinal()) for user_id, start, end in rows))
+    cache.set(key, coverage.to_json(), ttl=COVERAGE_CACHE_TTL)
+    return coverage
+
+
+def check_team_coverage(user, start_date, end_date):
+    """
+    Checks whether a new leave for `user` over [start_date, end_date] would
+    put more of their team out at once than TEAM_COVERAGE_MAX_ABSENT_SHARE
+    allows (always at least one person). Returns a CoverageResult when the
+    threshold would be crossed, otherwise None. Each teammate counts once per
+    day however many of their leaves overlap, and the applicant counts once
+    (their other leaves are left out of the index). Users without a manager
+    and leaves entirely in the past are not checked.
+    """
+    if current_app.config['TEAM_COVERAGE_MODE'] == 'off' or not user.manager_id:
+        return None
+    start_date = max(start_date, datetime.date.today())
+    if start_date > end_date:
+        return None
+
+    coverage = get_team_coverage(user.manager_id, exclude_user_id=user.id)
+    allowed = max(1, int(coverage.team_size * current_app.config['TEAM_COVERAGE_MAX_ABSENT_SHARE']))
+    absent = coverage.max_absent(start_date, end_date) + 1  # including this request
+    if absent > allowed:
+        return CoverageResult(absent, allowed, coverage.team_size)
+    return None
+
+
+def coverage_message(result):
+    return (f"{result.absent} of the {result.team_size} people on your team (including you) would be out on the same day; "
+            f"the team limit is {result.allowed}.")
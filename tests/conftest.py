@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# app.py builds the app at import time from the environment, so point it at a
+# throwaway database before anything imports it
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['CACHE_BACKEND'] = 'memory'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,56 @@
+"""
+absence_heatmap counts people, not leaves: overlapping leaves of one
+employee make them absent once per day.
+"""
+import datetime
+import pytest
+from app import app
+from extensions import db
+from models import User, UserRole, Leave, LeaveStatus, LeaveType
+from absence_heatmap import absence_heatmap
+
+START = datetime.date(2030, 3, 4)  # a Monday
+
+
+def _day(offset):
+    return START + datetime.timedelta(days=offset)
+
+
+@pytest.fixture
+def heatmap_db():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        alice = User(name='Alice', email='alice@test.example', role=UserRole.EMPLOYEE, password_hash='x')
+        bob = User(name='Bob', email='bob@test.example', role=UserRole.EMPLOYEE, password_hash='x')
+        db.session.add_all([alice, bob])
+        db.session.flush()
+        db.session.add_all([
+            # Alice: an approved vacation, a pending one overlapping it and a sick day inside both
+            Leave(user_id=alice.id, leave_type=LeaveType.VACATION, status=LeaveStatus.APPROVED,
+                  start_date=_day(0), end_date=_day(3), reason='Trip'),
+            Leave(user_id=alice.id, leave_type=LeaveType.VACATION, status=LeaveStatus.PENDING,
+                  start_date=_day(2), end_date=_day(5), reason='Longer trip'),
+            Leave(user_id=alice.id, leave_type=LeaveType.SICK, status=LeaveStatus.APPROVED,
+                  start_date=_day(3), end_date=_day(3), reason='Flu'),
+            Leave(user_id=bob.id, leave_type=LeaveType.VACATION, status=LeaveStatus.APPROVED,
+                  start_date=_day(3), end_date=_day(4), reason='Break'),
+        ])
+        db.session.commit()
+        yield
+        db.session.remove()
+
+
+def test_overlapping_leaves_of_one_user_count_once(heatmap_db):
+    heatmap = absence_heatmap(_day(0), _day(6))
+    assert heatmap['total'] == [1, 1, 1, 2, 2, 1, 0]
+    assert heatmap['by_type']['VACATION'] == [1, 1, 1, 2, 2, 1, 0]
+    assert heatmap['by_type']['SICK'] == [0, 0, 0, 1, 0, 0, 0]
+    assert heatmap['by_status']['APPROVED'] == [1, 1, 1, 2, 1, 0, 0]
+    assert heatmap['by_status']['PENDING'] == [0, 0, 1, 1, 1, 1, 0]
+
+
+def test_leaves_are_clamped_to_the_range(heatmap_db):
+    heatmap = absence_heatmap(_day(2), _day(4), statuses=(LeaveStatus.APPROVED,))
+    assert heatmap['total'] == [1, 2, 1]
+    assert list(heatmap['by_status']) == ['APPROVED']
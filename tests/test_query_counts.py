@@ -0,0 +1,114 @@
+"""
+The listing endpoints must issue a bounded number of SQL statements: the
+count may depend on the viewer and the endpoint, never on how many users
+or leaves there are. Each endpoint is requested against a small and a
+larger team and the statements are counted with a before_cursor_execute
+listener on the engine.
+
+The CSV export reads CSV_EXPORT_PAGE_SIZE rows per query, so both data sets
+stay within one page.
+"""
+import datetime
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from app import app
+from extensions import db, cache
+from models import User, UserRole, Leave, LeaveStatus, LeaveType, Holiday
+import ledger
+import org_hierarchy
+
+SIZES = {
+    'small': (3, 2),     # (employees besides the logged-in one, leaves per employee)
+    'large': (40, 20),
+}
+
+START, END = '2000-01-01', '2100-01-01'
+ENDPOINTS = {
+    'manager dashboard': ('manager', '/manager/dashboard'),
+    'team report': ('manager', '/manager/export_team_leaves?filter_type=all'),
+    'csv export': ('manager', '/manager/export_team_leaves?filter_type=all&format=csv'),
+    'employee calendar feed': ('employee', f'/employee/get_leaves_for_calendar?start={START}&end={END}'),
+    'manager calendar feed': ('manager', f'/manager/get_team_leaves_for_calendar?start={START}&end={END}'),
+}
+
+
+def _seed(extra_employees, leaves_per_employee):
+    db.drop_all()
+    db.create_all()
+    password_hash = generate_password_hash('pw')
+    manager = User(name='Team Manager', email='manager@test.example', role=UserRole.MANAGER, password_hash=password_hash)
+    db.session.add(manager)
+    db.session.flush()
+    employees = [User(name='Team Employee', email='employee@test.example', role=UserRole.EMPLOYEE,
+                      password_hash=password_hash, manager_id=manager.id)]
+    employees += [User(name=f'Employee {i}', email=f'employee{i}@test.example', role=UserRole.EMPLOYEE,
+                       password_hash=password_hash, manager_id=manager.id) for i in range(extra_employees)]
+    db.session.add_all(employees)
+    db.session.flush()
+
+    today = datetime.date.today()
+    db.session.add(Holiday(date=today + datetime.timedelta(days=10), name='Company Day', is_critical=False))
+    statuses = list(LeaveStatus)
+    for employee in employees:
+        for i in range(leaves_per_employee):
+            # Weekly leaves around today, so both data sets exercise the same code paths
+            start = today + datetime.timedelta(days=7 * (i - leaves_per_employee // 2))
+            status = statuses[i % len(statuses)]
+            db.session.add(Leave(
+                user_id=employee.id, leave_type=list(LeaveType)[i % len(LeaveType)],
+                start_date=start, end_date=start + datetime.timedelta(days=1), reason='Planned time off',
+                status=status,
+                approved_by_id=manager.id if status != LeaveStatus.PENDING else None,
+                approved_at=datetime.datetime.utcnow() if status != LeaveStatus.PENDING else None,
+            ))
+    db.session.commit()
+    ledger.rebuild_ledger()
+    org_hierarchy.rebuild_closure()
+    db.session.commit()
+
+
+def _login(email):
+    client = app.test_client()
+    response = client.post('/login', data={'email': email, 'password': 'pw'})
+    assert response.status_code == 302
+    return client
+
+
+def _count_queries(engine, client, url):
+    # A first request warms per-process state (holiday index, business-day calendar);
+    # the counted one starts from an empty cache so cached summaries are rebuilt
+    assert client.get(url).status_code == 200
+    cache.clear()
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(url)
+        response.get_data()  # drain streamed responses while still counting
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.fixture(scope='module')
+def query_counts():
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    counts = {}
+    for size, (extra_employees, leaves_per_employee) in SIZES.items():
+        # Requests run outside this app context; inside it they would share its `g` (and logged-in user)
+        with app.app_context():
+            _seed(extra_employees, leaves_per_employee)
+            engine = db.engine
+        clients = {'manager': _login('manager@test.example'), 'employee': _login('employee@test.example')}
+        counts[size] = {name: _count_queries(engine, clients[role], url) for name, (role, url) in ENDPOINTS.items()}
+    return counts
+
+
+@pytest.mark.parametrize('endpoint', list(ENDPOINTS))
+def test_query_count_does_not_grow_with_rows(query_counts, endpoint):
+    assert query_counts['small'][endpoint] == query_counts['large'][endpoint], query_counts
@@ -0,0 +1,300 @@
+"""
+Bulk user provisioning from CSV or JSON files.
+
+    name,email,role,manager_email,password
+    Ana Cruz,ana@example.com,Manager,,
+    Ben Reyes,ben@example.com,Employee,ana@example.com,Welcome-123
+
+JSON files hold a list of objects with the same keys. Only `name` and
+`email` are required: `role` defaults to Employee, `manager_email` may name
+an existing manager or a manager created by the same file, and a blank
+`password` gets a generated temporary one. As with the Add User form,
+admins have no manager and every new account must change its password at
+first login.
+
+plan_import() validates a whole file with one query against the User table
+(the dry-run report); provision_users() hashes the temporary passwords
+across a process pool and inserts the accounts in batched transactions.
+Between the web dry run and its confirmation the validated rows wait in the
+cache (stage_import / take_staged_import) with the file's passwords already
+hashed, so no password goes back to the browser or into a cache file.
+"""
+import csv
+import json
+import multiprocessing
+import os
+import secrets
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+from email_validator import EmailNotValidError, validate_email
+from flask import current_app
+from sqlalchemy import insert, select
+from werkzeug.security import generate_password_hash
+from extensions import db, cache
+from models import User, UserRole
+from utils import bump_data_version, invalidate_team_summary
+from calendar_feed import USERS_VERSION_KEY
+import org_hierarchy
+
+# password is the file's plaintext one; password_hash replaces it once a dry run is staged
+UserEntry = namedtuple('UserEntry', 'name email role manager_email password password_hash', defaults=(None,))
+
+# Below this many passwords, starting worker processes costs more than it saves
+MIN_PARALLEL_HASHES = 8
+# Seconds a web dry run can still be confirmed
+STAGED_IMPORT_TTL = 3600
+
+
+class UserImportError(ValueError):
+    """Raised when a file cannot be parsed; the message lists the offending rows."""
+
+
+def _parse_role(value):
+    value = (value or '').strip()
+    if not value:
+        return UserRole.EMPLOYEE
+    for role in UserRole:
+        if value.lower() in (role.name.lower(), role.value.lower()):
+            return role
+    raise ValueError(f"unknown role '{value}'")
+
+
+def _entry(record):
+    """Builds a UserEntry from a dict of raw (string) values."""
+    name = str(record.get('name') or '').strip()
+    if not 2 <= len(name) <= 100:
+        raise ValueError("name must be 2 to 100 characters")
+    try:
+        email = validate_email(str(record.get('email') or '').strip(), check_deliverability=False).normalized
+    except EmailNotValidError as e:
+        raise ValueError(f"invalid email: {e}")
+    manager_email = str(record.get('manager_email') or '').strip().lower() or None
+    password = str(record.get('password') or '') or None
+    return UserEntry(name, email, _parse_role(record.get('role')), manager_email, password)
+
+
+def parse_users_csv(text):
+    reader = csv.DictReader(StringIO(text))
+    fields = {(name or '').strip().lower(): name for name in reader.fieldnames or []}
+    if 'name' not in fields or 'email' not in fields:
+        raise UserImportError("The CSV needs a header row with 'name' and 'email' columns.")
+
+    entries, errors = [], []
+    for line_no, row in enumerate(reader, start=2):
+        record = {key: row.get(column) for key, column in fields.items()}
+        if not any((value or '').strip() for value in record.values()):
+            continue  # blank line
+        try:
+            entries.append(_entry(record))
+        except ValueError as e:
+            errors.append(f"Line {line_no}: {e}")
+    if errors:
+        raise UserImportError("\n".join(errors))
+    return entries
+
+
+def parse_users_json(text):
+    try:
+        records = json.loads(text)
+    except ValueError as e:
+        raise UserImportError(f"Invalid JSON: {e}")
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise UserImportError("The JSON file must hold a list of user objects.")
+
+    entries, errors = [], []
+    for position, record in enumerate(records, start=1):
+        try:
+            entries.append(_entry({key.lower(): value for key, value in record.items()}))
+        except ValueError as e:
+            errors.append(f"User {position}: {e}")
+    if errors:
+        raise UserImportError("\n".join(errors))
+    return entries
+
+
+def parse_user_file(filename, data):
+    """Parses an uploaded file's bytes by extension (.csv or .json)."""
+    text = data.decode('utf-8-sig') if isinstance(data, bytes) else data
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return parse_users_csv(text)
+    if extension == 'json':
+        return parse_users_json(text)
+    raise UserImportError("Only .csv and .json files can be imported.")
+
+
+def plan_import(entries):
+    """
+    Validates entries against each other and the User table (one query) and
+    returns the dry-run report:
+    {'new': [entry], 'errors': [message], 'roles': {role value: count},
+     'managers': {manager email: (existing user id or None, name)}}.
+    Nothing is written.
+    """
+    emails = {entry.email.lower() for entry in entries}
+    manager_emails = {entry.manager_email for entry in entries if entry.manager_email}
+    existing = {}
+    if emails or manager_emails:
+        existing = {email.lower(): (user_id, name, role) for user_id, email, name, role in db.session.query(
+            User.id, User.email, User.name, User.role
+        ).filter(db.func.lower(User.email).in_(emails | manager_emails))}
+    new_managers = {entry.email.lower(): entry for entry in entries if entry.role == UserRole.MANAGER}
+
+    report = {'new': [], 'errors': [], 'roles': {}, 'managers': {}}
+    seen = set()
+    for entry in entries:
+        email = entry.email.lower()
+        problem = None
+        if email in seen:
+            problem = "appears more than once in the file"
+        elif email in existing:
+            problem = "already has an account"
+        elif entry.manager_email and entry.role == UserRole.ADMIN:
+            problem = "admins cannot have a manager"
+        elif entry.manager_email and entry.manager_email == email:
+            problem = "cannot be their own manager"
+        elif entry.manager_email and entry.manager_email in existing:
+            manager_id, manager_name, manager_role = existing[entry.manager_email]
+            if manager_role != UserRole.MANAGER:
+                problem = f"{entry.manager_email} is not a manager"
+            else:
+                report['managers'][entry.manager_email] = (manager_id, manager_name)
+        elif entry.manager_email and entry.manager_email in new_managers:
+            report['managers'][entry.manager_email] = (None, new_managers[entry.manager_email].name)
+        elif entry.manager_email:
+            problem = f"manager {entry.manager_email} not found"
+        seen.add(email)
+
+        if problem:
+            report['errors'].append(f"{entry.email}: {problem}")
+        else:
+            report['new'].append(entry)
+
+    # Managers created by the file must not (indirectly) report to their own reports
+    levels = _reporting_levels(report['new'])
+    for entry in report['new']:
+        if entry.email.lower() not in levels:
+            report['errors'].append(f"{entry.email}: the reporting line loops back on itself")
+    report['new'] = [entry for entry in report['new'] if entry.email.lower() in levels]
+    for entry in report['new']:
+        report['roles'][entry.role.value] = report['roles'].get(entry.role.value, 0) + 1
+    return report
+
+
+def _reporting_levels(entries):
+    """
+    {email: level}: 0 for entries whose manager is not in `entries` (an
+    existing user, or none), otherwise their manager's level + 1. Entries
+    whose reporting line loops are left out.
+    """
+    in_file = {entry.email.lower() for entry in entries}
+    levels = {}
+    remaining = entries
+    level = 0
+    while remaining:
+        ready = [entry for entry in remaining if entry.manager_email not in in_file or entry.manager_email in levels]
+        if not ready:
+            break
+        for entry in ready:
+            levels[entry.email.lower()] = level
+        remaining = [entry for entry in remaining if entry.email.lower() not in levels]
+        level += 1
+    return levels
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hashes passwords with Werkzeug's generate_password_hash, in parallel
+    across worker processes (the hash is CPU-bound, so threads would not
+    help). Returns the hashes in input order.
+    """
+    workers = workers or current_app.config['USER_IMPORT_HASH_WORKERS'] or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) < MIN_PARALLEL_HASHES:
+        return [generate_password_hash(password) for password in passwords]
+    # Spawned, not forked: forking a multi-threaded server process can deadlock the child
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(passwords)), mp_context=context) as pool:
+        return list(pool.map(generate_password_hash, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def _staged_import_key(token):
+    return f"user-import:{token}"
+
+
+def stage_import(entries, admin_id):
+    """
+    Keeps a dry run's validated entries in the cache for admin_id and returns
+    the token that confirms them. Passwords from the file are hashed here;
+    blank ones are still generated when the users are created.
+    """
+    with_password = [entry for entry in entries if entry.password]
+    hashes = dict(zip((entry.email for entry in with_password),
+                      hash_passwords([entry.password for entry in with_password])))
+    token = secrets.token_urlsafe(16)
+    cache.set(_staged_import_key(token), {
+        'admin_id': admin_id,
+        'users': [[entry.name, entry.email, entry.role.name, entry.manager_email, hashes.get(entry.email)]
+                  for entry in entries],
+    }, ttl=STAGED_IMPORT_TTL)
+    return token
+
+
+def take_staged_import(token, admin_id):
+    """
+    Returns the entries stage_import() kept under token for admin_id and
+    forgets them, or None if the token is unknown, expired or someone else's.
+    """
+    key = _staged_import_key(token)
+    staged = cache.get(key)
+    if not staged or staged['admin_id'] != admin_id:
+        return None
+    cache.delete(key)
+    return [UserEntry(name, email, UserRole[role], manager_email, None, password_hash)
+            for name, email, role, manager_email, password_hash in staged['users']]
+
+
+def provision_users(entries, batch_size=None):
+    """
+    Creates the accounts of a plan_import() report's 'new' entries, level by
+    level down the reporting lines so every manager (and their closure rows)
+    exists before their reports are inserted. Each batch is its own
+    transaction. Returns [(entry, temporary password)] in input order; the
+    password is None for staged entries whose hashed password came from the file.
+    """
+    batch_size = batch_size or current_app.config['USER_IMPORT_BATCH_SIZE']
+    levels = _reporting_levels(entries)
+    passwords = [None if entry.password_hash else entry.password or secrets.token_urlsafe(9) for entry in entries]
+    to_hash = [password for password in passwords if password is not None]
+    new_hashes = iter(hash_passwords(to_hash))
+    hashes = [entry.password_hash or next(new_hashes) for entry in entries]
+    rows = list(zip(entries, hashes))
+
+    touched_managers = set()
+    for level in range(max(levels.values(), default=-1) + 1):
+        level_rows = [row for row in rows if levels[row[0].email.lower()] == level]
+        manager_emails = {entry.manager_email for entry, _ in level_rows if entry.manager_email}
+        manager_ids = {}
+        if manager_emails:
+            manager_ids = {email.lower(): user_id for user_id, email in db.session.query(User.id, User.email).filter(
+                db.func.lower(User.email).in_(manager_emails), User.role == UserRole.MANAGER
+            )}
+        touched_managers.update(manager_ids.values())
+
+        for start in range(0, len(level_rows), batch_size):
+            batch = level_rows[start:start + batch_size]
+            db.session.execute(insert(User), [{
+                'name': entry.name,
+                'email': entry.email,
+                'password_hash': password_hash,
+                'role': entry.role,
+                'manager_id': manager_ids.get(entry.manager_email),
+                'force_password_change': True,
+            } for entry, password_hash in batch])
+            org_hierarchy.insert_users(select(User.id).where(User.email.in_([entry.email for entry, _ in batch])))
+            db.session.commit()
+
+    bump_data_version(USERS_VERSION_KEY)
+    db.session.commit()
+    invalidate_team_summary(*touched_managers)
+    return list(zip(entries, passwords))
@@ -1,7 +1,8 @@
 from functools import wraps
 from flask import abort, flash, redirect, url_for
 from flask_login import current_user
-from models import UserRole, Holiday
+from models import UserRole
+from sqlalchemy import func
 import datetime
 
 def role_required(role):
@@ -28,124 +29,195 @@ def allowed_file(filename, allowed_extensions):
 
 def is_holiday_or_critical_day(date_obj):
     """Checks if a given date is a holiday or critical day."""
-    return Holiday.query.filter_by(date=date_obj).first() is not None
+    from holiday_index import get_holiday_index
+    return get_holiday_index().first_blocked_day(date_obj, date_obj) is not None
+
+def get_data_version(name):
+    """Current value of a DataVersion counter (0 if it was never bumped)."""
+    from models import DataVersion
+    from extensions import db
+    return db.session.query(DataVersion.version).filter(DataVersion.name == name).scalar() or 0
+
+def bump_data_version(name):
+    """Increments a DataVersion counter as part of the current transaction."""
+    from models import DataVersion
+    from extensions import db
+    from sqlalchemy import update
+    result = db.session.execute(
+        update(DataVersion).where(DataVersion.name == name).values(version=DataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.session.add(DataVersion(name=name, version=1))
 
 def get_leave_summary(user, month=None, year=None):
+    """
+    Computes the employee dashboard counters for the given period (defaults to
+    the current month/year), in working days. Yearly totals come from the
+    LeaveBalance ledger; the month and approved-to-date counters need the leave
+    dates, so they are counted from that year's leaves in one query.
+    """
     from models import Leave, LeaveStatus, LeaveType
-    from sqlalchemy import func
+    from extensions import db
+    from ledger import get_year_balances
+    from leave_duration import total_working_days
 
-    # Base query for leaves by user
-    query = Leave.query.filter_by(user_id=user.id)
+    current_date = datetime.date.today()
+    year = year or current_date.year
+    month = month or current_date.month
 
-    # Filter by year if specified
-    if year:
-        query = query.filter(func.strftime('%Y', Leave.start_date) == str(year))
+    year_start = datetime.date(year, 1, 1)
+    next_year_start = datetime.date(year + 1, 1, 1)
+    month_start = datetime.date(year, month, 1)
+    next_month_start = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
 
-    # Filter by month if specified
-    if month:
-        query = query.filter(func.strftime('%m', Leave.start_date) == f'{month:02d}')
+    leaves = db.session.query(Leave.start_date, Leave.end_date, Leave.status).filter(
+        Leave.user_id == user.id,
+        Leave.start_date >= year_start,
+        Leave.start_date < next_year_start,
+    ).all()
+    # Leaves This Month
+    total_leaves_month = total_working_days(
+        [(start, end) for start, end, _ in leaves if month_start <= start < next_month_start])
+    # Leaves Year to Date (approved and already started)
+    leaves_ytd_approved = total_working_days(
+        [(start, end) for start, end, status in leaves if status == LeaveStatus.APPROVED and start <= current_date])
 
-    leaves = query.all()
+    balances = get_year_balances(user.id, year)
 
-    # Initialize summary
-    summary = {
-        'total_leaves_month': 0,
-        'total_leaves_year': 0,
-        'leaves_ytd_approved': 0,
-        'leaves_ytd_less_sl': 0,
-        'vl_ytd': 0,
-        'sl_ytd': 0,
-        'pending_leaves_count': 0,
+    def total(leave_type=None, status=None, exclude_type=None):
+        return sum(
+            days for (lt, st), days in balances.items()
+            if (leave_type is None or lt == leave_type)
+            and (status is None or st == status)
+            and (exclude_type is None or lt != exclude_type)
+        )
+
+    return {
+        'total_leaves_month': total_leaves_month,
+        'total_leaves_year': total(),
+        'pending_leaves_count': total(status=LeaveStatus.PENDING),
+        'leaves_ytd_approved': leaves_ytd_approved,
+        # Leaves this year less SL (includes unapproved and approved leaves without the SL total)
+        'leaves_ytd_less_sl': total(exclude_type=LeaveType.SICK),
+        'vl_ytd': total(leave_type=LeaveType.VACATION),
+        'sl_ytd': total(leave_type=LeaveType.SICK),
     }
 
-    current_date = datetime.date.today()
-    current_year = current_date.year
-    current_month = current_date.month
-
-    for leave in user.leaves_applied: # Iterate over all applied leaves of the user
-        # Check if the leave falls within the current month (for 'Leaves This Month')
-        if leave.start_date.month == current_month and leave.start_date.year == current_year:
-            summary['total_leaves_month'] += (leave.end_date - leave.start_date).days + 1
-
-        # Check if the leave falls within the current year (for 'Leaves this Year', VLs YTD, SLs YTD)
-        if leave.start_date.year == current_year:
-            summary['total_leaves_year'] += (leave.end_date - leave.start_date).days + 1
-            if leave.status == LeaveStatus.PENDING:
-                summary['pending_leaves_count'] += (leave.end_date - leave.start_date).days + 1
-
-            # Leaves Year to Date (approved consumed already)
-            # This is tricky without a specific column for 'consumed'. For simplicity, we'll count approved leaves starting before or on today.
-            if leave.status == LeaveStatus.APPROVED and leave.start_date <= current_date:
-                summary['leaves_ytd_approved'] += (leave.end_date - leave.start_date).days + 1
-
-            # Leaves this current year less SL (includes unapproved and approved leaves without the SL total)
-            if leave.leave_type != LeaveType.SICK:
-                summary['leaves_ytd_less_sl'] += (leave.end_date - leave.start_date).days + 1
-
-            # VLs YTD
-            if leave.leave_type == LeaveType.VACATION:
-                summary['vl_ytd'] += (leave.end_date - leave.start_date).days + 1
-
-            # SLs YTD
-            if leave.leave_type == LeaveType.SICK:
-                summary['sl_ytd'] += (leave.end_date - leave.start_date).days + 1
-    
+def managed_employee_ids_subquery(manager_id, subtree=False):
+    """
+    SELECT of the ids of a manager's direct reports, for use in Leave.user_id.in_(...).
+    With subtree=True: everyone below the manager at any depth (see org_hierarchy.py).
+    """
+    from models import User
+    from sqlalchemy import select
+    if subtree:
+        from org_hierarchy import subtree_ids_subquery
+        return subtree_ids_subquery(manager_id)
+    return select(User.id).where(User.manager_id == manager_id)
+
+def _team_summary_key(manager_id, period, subtree=False, holiday_version=None):
+    # Day counts depend on the holiday calendar, so a holiday change (a new
+    # holiday version) retires every cached team summary at once
+    from holiday_index import HOLIDAY_VERSION_KEY
+    scope = 'subtree' if subtree else 'team'
+    if holiday_version is None:
+        holiday_version = get_data_version(HOLIDAY_VERSION_KEY)
+    return f"team_summary:{scope}:{manager_id}:{period}:{holiday_version}"
+
+def invalidate_team_summary(*manager_ids):
+    """
+    Drops the cached team summary of each given manager (None entries are
+    ignored), and the subtree summaries of those managers and everyone above them.
+    """
+    from extensions import cache
+    from org_hierarchy import ancestor_ids
+
+    period = datetime.date.today().strftime('%Y-%m')
+    manager_ids = {manager_id for manager_id in manager_ids if manager_id is not None}
+    for manager_id in manager_ids:
+        cache.delete(_team_summary_key(manager_id, period))
+    for manager_id in ancestor_ids(manager_ids):
+        cache.delete(_team_summary_key(manager_id, period, subtree=True))
+
+def get_team_leave_summary(manager, subtree=False, holiday_version=None):
+    """
+    Team counters for the manager dashboard (in working days), cached per
+    manager, scope, month and holiday version (looked up unless given). With
+    subtree=True the counters cover everyone below the manager, not just
+    direct reports. Leave writes and manager reassignments call
+    invalidate_team_summary().
+    """
+    from extensions import cache
+
+    today = datetime.date.today()
+    key = _team_summary_key(manager.id, today.strftime('%Y-%m'), subtree, holiday_version)
+    summary = cache.get(key)
+    if summary is None:
+        summary = _compute_team_leave_summary(managed_employee_ids_subquery(manager.id, subtree), today)
+        cache.set(key, summary)
     return summary
 
-def get_team_leave_summary(manager):
-    from models import Leave, LeaveStatus, LeaveType
-    from sqlalchemy import func
+def _compute_team_leave_summary(member_ids, today):
+    from models import Leave, LeaveBalance, LeaveStatus, LeaveType
+    from extensions import db
+    from leave_duration import total_working_days
+
+    month_start = today.replace(day=1)
+    next_month_start = datetime.date(today.year + 1, 1, 1) if today.month == 12 else datetime.date(today.year, today.month + 1, 1)
 
-    team_members = manager.managed_employees.all()
-    team_leaves = Leave.query.filter(Leave.user_id.in_([emp.id for emp in team_members])).all()
+    total_team_leaves_month = total_working_days(db.session.query(Leave.start_date, Leave.end_date).filter(
+        Leave.user_id.in_(member_ids),
+        Leave.start_date >= month_start,
+        Leave.start_date < next_month_start,
+    ).all())
+
+    # Yearly totals straight from the ledger: a few rows per team member
+    balances = db.session.query(
+        LeaveBalance.leave_type, LeaveBalance.status, func.sum(LeaveBalance.days)
+    ).filter(
+        LeaveBalance.user_id.in_(member_ids),
+        LeaveBalance.year == today.year,
+    ).group_by(LeaveBalance.leave_type, LeaveBalance.status).all()
 
     summary = {
-        'total_team_leaves_month': 0,
+        'total_team_leaves_month': total_team_leaves_month,
         'total_team_leaves_year': 0,
         'team_pending_leaves_count': 0,
         'team_approved_leaves_count': 0,
         'team_vl_ytd': 0,
         'team_sl_ytd': 0,
     }
+    for leave_type, status, days in balances:
+        days = int(days or 0)
+        summary['total_team_leaves_year'] += days
+        if status == LeaveStatus.PENDING:
+            summary['team_pending_leaves_count'] += days
+        elif status == LeaveStatus.APPROVED:
+            summary['team_approved_leaves_count'] += days
+
+        if leave_type == LeaveType.VACATION:
+            summary['team_vl_ytd'] += days
+        elif leave_type == LeaveType.SICK:
+            summary['team_sl_ytd'] += days
 
-    current_date = datetime.date.today()
-    current_year = current_date.year
-    current_month = current_date.month
-
-    for leave in team_leaves:
-        days = (leave.end_date - leave.start_date).days + 1
-
-        if leave.start_date.month == current_month and leave.start_date.year == current_year:
-            summary['total_team_leaves_month'] += days
-
-        if leave.start_date.year == current_year:
-            summary['total_team_leaves_year'] += days
-            if leave.status == LeaveStatus.PENDING:
-                summary['team_pending_leaves_count'] += days
-            elif leave.status == LeaveStatus.APPROVED:
-                summary['team_approved_leaves_count'] += days
-            
-            if leave.leave_type == LeaveType.VACATION:
-                summary['team_vl_ytd'] += days
-            elif leave.leave_type == LeaveType.SICK:
-                summary['team_sl_ytd'] += days
-                
     return summary
 
-def generate_dashboard_greeting(user):
+def generate_dashboard_greeting(user, holiday_index=None):
     # 
     # Generates a personalized greeting message for the dashboard,
     # including information about upcoming holidays.
     # 
+    from holiday_index import get_holiday_index
+
     today = datetime.date.today()
     greeting = f"Welcome back, {user.name.split()[0]}!" # Greet by first name
 
-    # Find the next 2 upcoming holidays within the next 90 days
-    upcoming_holidays = Holiday.query.filter(
-        Holiday.is_critical == False, 
-        Holiday.date >= today,
-        Holiday.date <= today + datetime.timedelta(days=90)
-    ).order_by(Holiday.date.asc()).limit(2).all()
+    # Find the next 2 upcoming holidays within the next 90 days (from the in-memory holiday index)
+    holiday_index = holiday_index or get_holiday_index()
+    upcoming_holidays = [
+        holiday for holiday in holiday_index.between(today, today + datetime.timedelta(days=90))
+        if not holiday.is_critical
+    ][:2]
 
     holiday_message = ""
     if not upcoming_holidays: